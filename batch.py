@@ -0,0 +1,240 @@
+"""
+Headless batch runner for the energy windowing and scan reconstruction analyses.
+
+Runs the models without Tk, using Matplotlib's Agg backend, and writes the
+numeric results (and optionally the figures) of every job to an output
+directory. All jobs run in one process, so the detector geometry and q bin
+lookups computed for one job are reused by the next.
+
+Examples
+--------
+A single job from flags:
+    python batch.py --analysis scan_reconstruction --sample-file-path scans/ \
+        --background-file-path open_beam.hxt --scan-width 20 --output results/
+
+A list of jobs from a JSON config file:
+    python batch.py --config jobs.json --output results/
+
+where jobs.json looks like
+    {
+        "defaults": {"detector_distance_mm": 244, "transmission_beam_x": 9},
+        "jobs": [
+            {"name": "caffeine", "analysis": "energy_windowing",
+             "sample_file_path": "caffeine.hxt", "background_file_path": "bg.hxt"}
+        ]
+    }
+Parameter names are the values of EnergyWindowingModel.Property and
+ScanReconstructionModel.Property. Flags given on the command line act as
+defaults for every job of the config file.
+
+With --profile, the time spent in every stage of a job (reading, geometry,
+binning, windowing, maps, plotting) is written to its profile.json, see
+models/telemetry.py. --profile-memory also records the peak memory of every
+stage, which slows the run down.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+from models import EnergyWindowingModel, ScanReconstructionModel
+from models.telemetry import Telemetry, format_report
+
+ANALYSES = {
+    "energy_windowing": EnergyWindowingModel,
+    "scan_reconstruction": ScanReconstructionModel,
+}
+
+
+def boolean(value) -> bool:
+    """Parses a flag given as a JSON bool or a command line string"""
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+# Types and defaults of every model parameter, matching the GUI's defaults
+PARAMETERS = {
+    "energy_range_min": (int, 0),
+    "energy_range_max": (int, 100),
+    "bin_width": (int, 1),
+    "energy_window_width": (int, 100),
+    "sample_file_path": (str, None),
+    "background_file_path": (str, None),
+    "detector_distance_mm": (float, 100.0),
+    "global_q_start": (float, 0.0),
+    "global_q_end": (float, 30.0),
+    "transmission_beam_x": (int, 0),
+    "transmission_beam_y": (int, 0),
+    "integral_q_start": (float, 0.0),
+    "integral_q_end": (float, 30.0),
+    "scan_width": (int, 1),
+    "file_extension": (str, ".hxt"),
+    # Processes reducing a scan, 1 reads ahead in this process like the GUI
+    "workers": (int, 1),
+    # Files read ahead while one is reduced by a single worker, None keeps the
+    # model's default. Ignored with more workers, which read their own files
+    "prefetch": (int, None),
+    # Keeps the energy resolved spectra of a scan, needed to rewindow it
+    "keep_energy_spectra": (boolean, False),
+    # None keeps the model's default cache location, "" disables the cache
+    "spectra_cache_path": (str, None),
+    # "serpentine", "mss_stage" or "gal_stage", see ScanReconstructionModel.MapLayout
+    "map_layout": (str, "serpentine"),
+    "sparse_frames": (boolean, False),
+    "shared_colorbar": (boolean, True),
+    # Scans keep their full result in <output>/result_cube.npy unless given
+    "result_cube_path": (str, None),
+    # None keeps the model's default, see models.rendering.MAX_LINES
+    "waterfall_lines": (int, None),
+}
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run sSAXS analyses without the GUI.")
+    parser.add_argument("--analysis", choices=ANALYSES,
+                        help="Analysis of the job given by flags")
+    parser.add_argument("--config",
+                        help="JSON file with a list of jobs, see the module docstring")
+    parser.add_argument("--output", required=True,
+                        help="Directory the results are written to")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="Only write numeric results, skip the figures")
+    parser.add_argument("--profile", action="store_true",
+                        help="Write the time spent in every stage to <job>/profile.json")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Also record the peak memory of every stage (slower)")
+    for name, (type_, _) in PARAMETERS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=type_)
+    args = parser.parse_args(argv)
+    if args.config is None and args.analysis is None:
+        parser.error("either --analysis or --config is required")
+    return args
+
+
+def load_jobs(args: argparse.Namespace) -> list:
+    """Builds the list of jobs from the config file and/or the flags"""
+    flags = {name: getattr(args, name) for name in PARAMETERS
+             if getattr(args, name) is not None}
+    if args.config is None:
+        return [dict(flags, analysis=args.analysis)]
+    with open(args.config) as file:
+        config = json.load(file)
+    if isinstance(config, list):
+        config = {"jobs": config}
+    defaults = dict(flags, **config.get("defaults", {}))
+    return [dict(defaults, **job) for job in config["jobs"]]
+
+
+def model_data(model_class, job: dict) -> dict:
+    data = {}
+    for prop in model_class.Property:
+        type_, default = PARAMETERS[prop.value]
+        value = job.get(prop.value, default)
+        if value is not None:
+            data[prop] = type_(value)
+    return data
+
+
+def save_energy_windowing(model: EnergyWindowingModel, output_dir: str):
+    spectra = model.dataset.spectra
+    np.savez(
+        os.path.join(output_dir, "results.npz"),
+        q_range=model.q_range,
+        sample_spectra=spectra[0],
+        background_spectra=spectra[1],
+        window_start_keV=[window[0] for window in model.windows.values()],
+        window_end_keV=[window[-1] for window in model.windows.values()],
+        theta=model.theta,
+    )
+
+
+def save_scan_reconstruction(model: ScanReconstructionModel, output_dir: str):
+    # Stage layouts also record the position of every map column and row
+    positions = {} if model.map_x is None else {"map_x": model.map_x, "map_y": model.map_y}
+    np.savez(
+        os.path.join(output_dir, "results.npz"),
+        q_range=model.q_range,
+        spectra=model.dataset.spectra,
+        heatmap=model.heatmap,
+        aups=model.aups,
+        theta=model.theta,
+        **positions,
+    )
+    with open(os.path.join(output_dir, "files.txt"), "w") as file:
+        file.write("\n".join(model.dataset.files))
+
+
+SAVERS = {
+    "energy_windowing": save_energy_windowing,
+    "scan_reconstruction": save_scan_reconstruction,
+}
+
+
+def run_job(job: dict, output_dir: str, plots: bool,
+            telemetry: Telemetry = None) -> dict:
+    model_class = ANALYSES[job["analysis"]]
+    if model_class is ScanReconstructionModel and job.get("result_cube_path") is None:
+        job = dict(job, result_cube_path=os.path.join(output_dir, "result_cube.npy"))
+    model = model_class(data=model_data(model_class, job))
+    telemetry = telemetry or model.telemetry
+    model.telemetry = telemetry
+    start = time.perf_counter()
+    model.analyze()
+    os.makedirs(output_dir, exist_ok=True)
+    with telemetry.span("save"):
+        SAVERS[job["analysis"]](model, output_dir)
+    if plots:
+        model.plot()
+        # Figures are only rendered when saved
+        with telemetry.span("savefig"):
+            for key, fig in model.figures.items():
+                with telemetry.span(key):
+                    fig.savefig(os.path.join(output_dir, f"{key}.png"))
+    result = {
+        "job": job,
+        "output": output_dir,
+        "seconds": time.perf_counter() - start,
+    }
+    if telemetry.enabled:
+        result["profile"] = os.path.join(output_dir, "profile.json")
+        with open(result["profile"], "w") as file:
+            json.dump(telemetry.report(), file, indent=2)
+        print(format_report(telemetry.report()))
+    return result
+
+
+def main(argv: list = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    jobs = load_jobs(args)
+    os.makedirs(args.output, exist_ok=True)
+    summary = []
+    for i, job in enumerate(jobs):
+        if job.get("analysis") not in ANALYSES:
+            raise SystemExit(f"Job {i}: unknown analysis {job.get('analysis')!r}")
+        name = job.get("name", f"{i:03d}_{job['analysis']}")
+        print(f"Job {i + 1}/{len(jobs)}: {name}")
+        if job.get("prefetch") is not None and int(job.get("workers", 1)) > 1:
+            print(f"Warning: prefetch is ignored with {job['workers']} workers, "
+                  "set workers to 1 to read ahead", file=sys.stderr)
+        telemetry = Telemetry(enabled=args.profile or args.profile_memory,
+                              trace_memory=args.profile_memory)
+        try:
+            summary.append(run_job(job, os.path.join(args.output, name),
+                                   plots=not args.no_plots, telemetry=telemetry))
+        finally:
+            telemetry.stop()
+    with open(os.path.join(args.output, "summary.json"), "w") as file:
+        json.dump(summary, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""
+Standalone benchmarks of the analysis pipeline on synthetic .hxt files, see
+run.py. Run from the repository root, e.g. python -m benchmarks.run.
+"""
@@ -0,0 +1,309 @@
+"""
+Golden output equivalence harness of the analysis engines.
+
+Runs the reference implementation (reference.py, the analysis as it was before
+any optimisation) and every engine of the current code on the same .hxt files,
+then checks that each engine reproduces the reference spectra, detector
+angles, scan map and detector images within the tolerance, and that it is at
+least its minimum speedup faster:
+
+    vectorized   bundle_data() then extract_spectra() in one process
+    compact      the same with the counts stored in compact integer types
+    parallel     extract_spectra() with worker processes
+    streaming    stream_spectra(), one file in memory at a time
+    prefetch     stream_spectra() reading the next files ahead on threads
+    sparse       bundle_data(sparse=True), nonzero cells only
+    cached       stream_spectra() served from a warm SpectraCache
+    energy_windowing_model, scan_reconstruction_model
+                 the models' analyze() and the data of their figures
+
+Synthetic files are written by default, recorded ones can be given instead:
+
+    python -m benchmarks.equivalence
+    python -m benchmarks.equivalence --samples "scans/*.hxt" --background bg.hxt
+
+The exit code is 1 if any check fails. Spectra are sums of the same counts in
+a different order, so they agree to rounding: the default tolerance is a
+relative 1e-9 and an absolute 1e-6 counts.
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmarks import reference
+from benchmarks.hxt_writer import write_scan
+from models import EnergyWindowingModel, ScanReconstructionModel, scan_map
+from models import sSAXS_tools as s
+from models.geometry import clear_cache
+from models.spectra_cache import SpectraCache
+
+RTOL, ATOL = 1e-9, 1e-6
+
+# Analysis parameters shared by the reference and the engines
+ENERGY_RANGE = np.arange(30, 80)
+ENERGY_WINDOW_WIDTH = 10
+Q_RANGE = np.linspace(0.04, 30.04, num=63)
+SAMPLE_DETECTOR_DISTANCE = 100.0
+INTEGRAL_Q = (7.0, 9.0)
+
+
+def extraction_parameters(size: int, workers: int = 1) -> dict:
+    return dict(samp_det_dist=SAMPLE_DETECTOR_DISTANCE, transm_beam_x_pos=size // 2,
+                transm_beam_y_pos=size // 2, energy_range=ENERGY_RANGE, q_range=Q_RANGE,
+                energy_window_width=ENERGY_WINDOW_WIDTH, workers=workers,
+                progress=lambda completed, total: None)
+
+
+def integral_q_range() -> np.ndarray:
+    """q bin indices of INTEGRAL_Q, as ScanReconstructionModel computes them"""
+    return np.arange(np.absolute(Q_RANGE - INTEGRAL_Q[0]).argmin(),
+                     np.absolute(Q_RANGE - INTEGRAL_Q[1]).argmin())
+
+
+def spectral_map(spectra: np.ndarray, scan_width: int) -> np.ndarray:
+    """The scan map of the current code from [file, window, q] spectra, background last"""
+    aups = scan_map.integrate_rois(spectra[:-1, 0], [integral_q_range()])[0]
+    return scan_map.serpentine_image(aups, scan_width)
+
+
+def run_reference(paths: list, size: int, scan_width: int) -> dict:
+    data_frame = reference.bundle_data(paths)
+    windows, theta = reference.extract_spectra(
+        data_frame, **{key: value for key, value in extraction_parameters(size).items()
+                       if key not in ("workers", "progress")})
+    spectra = np.stack(data_frame["Spectra"].tolist())
+    heatmap, aups = reference.spectral_heatmap(
+        list(spectra[:-1]), integral_q_range(), scan_width)
+    images = reference.window_images(
+        data_frame.at[0, "Image"], data_frame.at[len(data_frame) - 1, "Image"],
+        list(windows.values()) + [ENERGY_RANGE])
+    # The scan model integrates one window spanning the energy range, the sum
+    # of the windows since they partition it
+    scan_heatmap, scan_aups = reference.spectral_heatmap(
+        list(spectra[:-1].sum(axis=1, keepdims=True)), integral_q_range(), scan_width)
+    return dict(spectra=spectra, theta=theta, heatmap=heatmap, aups=aups,
+                scan_heatmap=scan_heatmap, scan_aups=scan_aups,
+                window_images=np.stack(images))
+
+
+def run_extraction(paths: list, size: int, scan_width: int, workers: int = 1,
+                   **bundle) -> dict:
+    dataset = s.bundle_data(paths, **bundle)
+    _, theta = s.extract_spectra(dataset, **extraction_parameters(size, workers))
+    return dict(spectra=dataset.spectra, theta=theta,
+                heatmap=spectral_map(dataset.spectra, scan_width))
+
+
+def run_streaming(paths: list, size: int, scan_width: int, cache: SpectraCache = None,
+                  prefetch: int = 0) -> dict:
+    dataset, _, theta = s.stream_spectra(paths, cache=cache, prefetch=prefetch,
+                                         **extraction_parameters(size))
+    return dict(spectra=dataset.spectra, theta=theta,
+                heatmap=spectral_map(dataset.spectra, scan_width))
+
+
+def run_energy_windowing_model(paths: list, size: int, scan_width: int) -> dict:
+    P = EnergyWindowingModel.Property
+    model = EnergyWindowingModel({
+        P.ENERGY_RANGE_MIN: int(ENERGY_RANGE[0]), P.ENERGY_RANGE_MAX: int(ENERGY_RANGE[-1]),
+        P.BIN_WIDTH: 1, P.ENERGY_WINDOW_WIDTH: ENERGY_WINDOW_WIDTH,
+        P.SAMPLE_FILE_PATH: paths[0], P.BACKGROUND_FILE_PATH: paths[-1],
+        P.DETECTOR_DISTANCE_mm: SAMPLE_DETECTOR_DISTANCE,
+        # The model builds its q bins from q start and end
+        P.q_START: Q_RANGE[0], P.q_END: Q_RANGE[-1],
+        P.TRANSMISSION_BEAM_X: size // 2, P.TRANSMISSION_BEAM_Y: size // 2})
+    model.q_range = Q_RANGE
+    model.analyze(progress=lambda completed, total: None)
+    images = [model.window_image(window) for window in model.windows.values()]
+    images.append(model.window_image(model.energy_range))
+    return dict(theta=model.theta, window_images=np.stack(images))
+
+
+def run_scan_reconstruction_model(paths: list, size: int, scan_width: int) -> dict:
+    directory = os.path.dirname(paths[0])
+    P = ScanReconstructionModel.Property
+    model = ScanReconstructionModel({
+        P.ENERGY_RANGE_MIN: int(ENERGY_RANGE[0]), P.ENERGY_RANGE_MAX: int(ENERGY_RANGE[-1]),
+        P.INTEGRAL_q_START: INTEGRAL_Q[0], P.INTEGRAL_q_END: INTEGRAL_Q[1],
+        P.SCAN_WIDTH: scan_width, P.SAMPLE_FILE_PATH: directory,
+        P.BACKGROUND_FILE_PATH: paths[-1], P.FILE_EXTENSION: ".hxt",
+        P.DETECTOR_DISTANCE_mm: SAMPLE_DETECTOR_DISTANCE,
+        P.q_START: Q_RANGE[0], P.q_END: Q_RANGE[-1],
+        P.TRANSMISSION_BEAM_X: size // 2, P.TRANSMISSION_BEAM_Y: size // 2,
+        P.SPECTRA_CACHE_PATH: ""})
+    model.analyze(progress=lambda completed, total: None)
+    return dict(scan_heatmap=model.heatmap, scan_aups=model.aups, theta=model.theta)
+
+
+def check(expected: dict, result: dict, rtol: float, atol: float) -> list:
+    """(quantity, max abs difference, passed) of every quantity the engine produced"""
+    rows = []
+    for key, value in result.items():
+        value = np.asarray(value, dtype=np.float64)
+        target = np.asarray(expected[key], dtype=np.float64)
+        if value.shape != target.shape:
+            rows.append((key, float("inf"), False))
+            continue
+        difference = float(np.max(np.abs(value - target))) if value.size else 0.0
+        rows.append((key, difference, bool(np.allclose(value, target, rtol=rtol, atol=atol))))
+    return rows
+
+
+def timed_best(function, repeat: int):
+    """(best seconds, last result) of repeat calls, each with a cold geometry cache"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        # The reference computes the geometry on every call, so the engines do too
+        clear_cache()
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def engines(paths: list, size: int, scan_width: int, workers: int, cache_path: str) -> dict:
+    """
+    Name: (function, minimum speedup over the reference) of every engine. The
+    models analyse other inputs than the reference run, e.g. only the first
+    scan file, so their speed is not checked.
+    """
+    cache = SpectraCache(cache_path)
+    # Warm the cache, so the engine measures cached runs
+    run_streaming(paths, size, scan_width, cache)
+    return {
+        "vectorized": (lambda: run_extraction(paths, size, scan_width), 5.0),
+        "compact": (lambda: run_extraction(paths, size, scan_width, compact=True), 5.0),
+        # Worker start up dominates scans this small
+        "parallel": (lambda: run_extraction(paths, size, scan_width, workers=workers), 2.0),
+        "streaming": (lambda: run_streaming(paths, size, scan_width), 5.0),
+        "prefetch": (lambda: run_streaming(paths, size, scan_width, prefetch=2), 5.0),
+        "sparse": (lambda: run_extraction(paths, size, scan_width, sparse=True), 3.0),
+        "cached": (lambda: run_streaming(paths, size, scan_width, cache), 20.0),
+        "energy_windowing_model": (
+            lambda: run_energy_windowing_model(paths, size, scan_width), None),
+        "scan_reconstruction_model": (
+            lambda: run_scan_reconstruction_model(paths, size, scan_width), None),
+    }, cache
+
+
+def run(paths: list, size: int, scan_width: int, workers: int = 2, repeat: int = 3,
+        rtol: float = RTOL, atol: float = ATOL, min_speedup: float = None) -> dict:
+    """
+    Checks every engine against the reference on the given files.
+
+    Parameters
+    ----------
+    paths : list of str
+        Scan files in scan order, the background last.
+    size : int
+        Detector rows, the beam is placed at its centre.
+    scan_width : int
+        Scans per row of the map.
+    workers : int, optional
+        Processes of the parallel engine. The default is 2.
+    repeat : int, optional
+        Runs of every engine, the fastest counts. The default is 3.
+    rtol, atol : float, optional
+        Tolerance of np.allclose() against the reference.
+    min_speedup : float, optional
+        Minimum speedup of every engine, overriding their own.
+
+    Returns
+    -------
+    dict
+        reference_seconds and the seconds, speedup, checks and passed of
+        every engine.
+    """
+    reference_seconds, expected = timed_best(
+        lambda: run_reference(paths, size, scan_width), 1)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        all_engines, cache = engines(paths, size, scan_width, workers,
+                                     os.path.join(directory, "cache.sqlite"))
+        with cache:
+            for name, (function, threshold) in all_engines.items():
+                if threshold is not None and min_speedup is not None:
+                    threshold = min_speedup
+                seconds, result = timed_best(function, repeat)
+                checks = check(expected, result, rtol, atol)
+                speedup = reference_seconds / seconds
+                results[name] = dict(
+                    seconds=seconds, speedup=speedup, min_speedup=threshold,
+                    checks=[dict(quantity=quantity, max_abs_difference=difference, passed=ok)
+                            for quantity, difference, ok in checks],
+                    passed=all(ok for _, _, ok in checks)
+                    and (threshold is None or speedup >= threshold))
+    return dict(reference_seconds=reference_seconds, rtol=rtol, atol=atol, engines=results)
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Check every analysis engine against the reference implementation.")
+    parser.add_argument("--samples", help="Glob of recorded scan files, synthetic if not given")
+    parser.add_argument("--background", help="Recorded background file, with --samples")
+    parser.add_argument("--files", type=int, default=9, help="Synthetic scan files")
+    parser.add_argument("--detector-size", type=int, default=40,
+                        help="Rows and columns of the synthetic detector")
+    parser.add_argument("--energy-bins", type=int, default=100,
+                        help="Energy bins of the synthetic files")
+    parser.add_argument("--mean-counts", type=float, default=0.3)
+    parser.add_argument("--scan-width", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rtol", type=float, default=RTOL)
+    parser.add_argument("--atol", type=float, default=ATOL)
+    parser.add_argument("--min-speedup", type=float,
+                        help="Minimum speedup of every engine, overriding their own")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    directory = tempfile.mkdtemp()
+    try:
+        if args.samples:
+            if not args.background:
+                raise SystemExit("--background is required with --samples")
+            # The scan model reads a directory, so the samples are linked into one
+            files = []
+            for i, sample in enumerate(sorted(glob.glob(args.samples))):
+                files.append(os.path.join(directory, f"scan_{i:05d}.hxt"))
+                os.symlink(os.path.abspath(sample), files[-1])
+            background = os.path.abspath(args.background)
+            size = s.hxtV3ReadHeader(background)["nRows"]
+        else:
+            size = args.detector_size
+            files, background = write_scan(
+                os.path.join(directory, "scan"), args.files, n_rows=size, n_cols=size,
+                n_bins=args.energy_bins, mean_counts=args.mean_counts)
+            # The background is kept out of the scan directory
+            background = shutil.move(background, os.path.join(directory, "background.hxt"))
+        report = run(files + [background], size, args.scan_width, workers=args.workers,
+                     repeat=args.repeat, rtol=args.rtol, atol=args.atol,
+                     min_speedup=args.min_speedup)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print(f"reference: {report['reference_seconds']:.3f} s")
+    for name, result in report["engines"].items():
+        worst = max((check["max_abs_difference"] for check in result["checks"]), default=0.0)
+        print(f"{'PASS' if result['passed'] else 'FAIL':4} {name:26} "
+              f"{result['seconds']:.3f} s  x{result['speedup']:.1f} "
+              + (f"(min x{result['min_speedup']:g})  " if result["min_speedup"] else "")
+              + f"max |diff| {worst:.3g}  "
+              + ", ".join(check["quantity"] for check in result["checks"]
+                          if not check["passed"]))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0 if all(result["passed"] for result in report["engines"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
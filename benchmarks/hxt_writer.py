@@ -0,0 +1,103 @@
+"""
+Writer of synthetic version 3 .hxt files.
+
+The files follow the layout parsed by hxtV3ReadHeader() and hxtV3Read(): the
+HXT_V3_PREAMBLE header, nBins float64 energy bins and the float64 detector
+counts stored [row, col, bin]. Counts are Poisson distributed, so the files
+behave like real low flux acquisitions for the reading and binning code.
+"""
+
+import os
+import numpy as np
+from models.sSAXS_tools import HXT_V3_PREAMBLE
+
+# Rows of counts generated and written at once, bounding memory for large detectors
+ROWS_PER_CHUNK = 16
+
+
+def write_hxt(path: str, n_rows: int = 80, n_cols: int = 80, n_bins: int = 100,
+              mean_counts=0.3, density: float = 1.0, seed: int = 0,
+              position: tuple = (0, 0), file_prefix: str = "synthetic",
+              timestamp: str = "2024-01-01 00:00") -> str:
+    """
+    Writes one synthetic .hxt file.
+
+    Parameters
+    ----------
+    path : str
+        File to write, overwritten if it exists.
+    n_rows, n_cols, n_bins : int, optional
+        Detector rows, columns and energy bins. The defaults are 80, 80 and 100.
+    mean_counts : float or np.ndarray, optional
+        Mean count of a cell, or [n_bins] mean count of the cells of every
+        energy bin. The default is 0.3.
+    density : float, optional
+        Fraction of the cells that can hold counts, the others are zero, e.g.
+        to mimic the mostly empty images of high energies. The default is 1.
+    seed : int, optional
+        Seed of the random counts. The default is 0.
+    position : tuple, optional
+        (x, y) stage position written to both the mss and Gal fields.
+    file_prefix, timestamp : str, optional
+        Text fields of the header.
+
+    Returns
+    -------
+    str
+        path.
+    """
+    rng = np.random.default_rng(seed)
+    x, y = (int(value) for value in position)
+    prefix = file_prefix.encode("latin-1")[:100]
+    header = HXT_V3_PREAMBLE.pack(
+        b"HEXITECH", 3, x, y, 0, 0, x, y, 0, 0, 0, len(prefix), prefix,
+        timestamp.encode("latin-1")[:16], n_rows, n_cols, n_bins)
+    mean_counts = np.broadcast_to(np.asarray(mean_counts, dtype=np.float64), (n_bins,))
+    with open(path, "wb") as file:
+        file.write(header)
+        file.write(np.arange(1, n_bins + 1, dtype="<f8").tobytes())
+        for start in range(0, n_rows, ROWS_PER_CHUNK):
+            shape = (min(ROWS_PER_CHUNK, n_rows - start), n_cols, n_bins)
+            counts = rng.poisson(mean_counts, size=shape).astype("<f8")
+            if density < 1:
+                counts *= rng.random(shape[:2] + (1,)) < density
+            file.write(counts.tobytes())
+    return path
+
+
+def write_scan(directory: str, n_files: int, scan_width: int = None, spacing: int = 10,
+               **kwargs) -> tuple:
+    """
+    Writes the files of a raster scan and its background.
+
+    Parameters
+    ----------
+    directory : str
+        Directory the files are written to, created if needed.
+    n_files : int
+        Number of scan files.
+    scan_width : int, optional
+        Scans per row of the stage positions. Defaults to the width of the
+        squarest grid.
+    spacing : int, optional
+        Distance between neighbouring stage positions. The default is 10.
+    **kwargs
+        Passed to write_hxt(), e.g. the detector size. Every file gets its own
+        seed.
+
+    Returns
+    -------
+    files : list of str
+        Paths of the scan files, in scan order.
+    background : str
+        Path of the background file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    scan_width = scan_width or max(int(np.ceil(np.sqrt(n_files))), 1)
+    seed = kwargs.pop("seed", 0)
+    files = [
+        write_hxt(os.path.join(directory, f"scan_{i:05d}.hxt"), seed=seed + i + 1,
+                  position=(i % scan_width * spacing, i // scan_width * spacing), **kwargs)
+        for i in range(n_files)]
+    background = write_hxt(os.path.join(directory, "background.hxt"), seed=seed, **kwargs)
+    return files, background
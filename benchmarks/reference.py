@@ -0,0 +1,267 @@
+"""
+Reference implementation of the analysis, as it was before any optimisation.
+
+The file reading, spectra extraction, heatmap and detector image code of the
+original sSAXS_tools.py and models, kept with their loops so equivalence.py
+can check the optimised engines against them. Only the plotting, printing and
+globbing were removed. Do not optimise this module.
+"""
+
+import math
+import numpy as np
+import pandas as pd
+
+
+def fread(filenergy_rangeD: str, sizeA: int, precision: str):
+    """
+
+
+    Parameters
+    ----------
+    filenergy_rangeD : TYPE
+        DESCRIPTION.
+    sizeA : TYPE
+        DESCRIPTION.
+    precision : TYPE
+        DESCRIPTION.
+
+    Returns
+    -------
+    TYPE
+        DESCRIPTION.
+
+    """
+    data_array = None
+    if precision == 'uint64':
+        return np.fromfile(filenergy_rangeD, np.uint64, count=sizeA)
+    elif precision == 'uint32':
+        return np.fromfile(filenergy_rangeD, np.uint32, count=sizeA)
+    elif precision == 'int32':
+        return np.fromfile(filenergy_rangeD, np.int32, count=sizeA)
+    elif precision == 'double':
+        return np.fromfile(filenergy_rangeD, np.double, count=sizeA)
+    elif precision == 'char':
+        data_array = np.fromfile(filenergy_rangeD, np.int8, count=sizeA)
+        return ''.join([chr(item) for item in data_array])
+    else:
+        return np.fromfile(filenergy_rangeD, np.int8, count=sizeA)
+
+
+def hxtV3Read(filePath: str):
+    """
+     Method to parse the header of the .hxt file format, you will need to write
+     your own version for any other file type you wish to use.
+
+     Parameters
+     ----------
+     filePath : str
+
+     Returns
+     -------
+     list [M,bins]
+         Returns a list of the file's detector images and the energy bins represented
+         in M's axis0.
+
+     """
+    #
+    fid = open(filePath, 'rb')
+    # read first 8 characters to distinguish file type
+    label = "%s" % fread(fid, 8, 'char')
+    M = 0
+    bins = 0
+    if label.lower() == 'hexitech':
+        version = fread(fid, 1, 'uint64')
+        if version == 3:
+            mssX = fread(fid, 1, 'uint32')
+            mssY = fread(fid, 1, 'uint32')
+            mssZ = fread(fid, 1, 'uint32')
+            MssRot = fread(fid, 1, 'uint32')
+            GalX = fread(fid, 1, 'uint32')
+            GalY = fread(fid, 1, 'uint32')
+            GalZ = fread(fid, 1, 'uint32')
+            GalRot = fread(fid, 1, 'uint32')
+            GalRot2 = fread(fid, 1, 'uint32')
+            nCharFPreFix = fread(fid, 1, 'int32')
+            filePreFix = fread(fid, nCharFPreFix[0], 'char')
+
+            # The next two lines are used to skip some unnecessary parts of the binary file
+            dummy = fread(fid, 100 - nCharFPreFix[0], 'dummy')
+            timestamp = fread(fid, 16, 'timestamp')
+
+            nRows = fread(fid, 1, 'uint32')
+            nCols = fread(fid, 1, 'uint32')
+            nBins = fread(fid, 1, 'uint32')
+            bins = fread(fid, nBins[0], 'double')
+            d = fread(fid, nBins[0] * nRows[0] * nCols[0], 'double')
+            M = np.reshape(d, [nRows[0], nCols[0], nBins[0]])
+            M = np.swapaxes(M, 0, 2)
+        else:
+            print("Not Version 3 of HXT File - Zeros Returned")
+    fid.close()
+    return [M, bins]
+
+
+def extract_spectra(data_frame: pd.DataFrame, **kwargs):
+    """
+    Calculates the momentum transfer spectra from the raw detector images.
+    Spectra are appended to the data frame at the same row of their corresponding
+    detector data.
+
+    Parameters
+    ----------
+    data_frame : pd.DataFrame
+        Data frame of the extraced detector data from bundle_data().
+    **kwargs : np.ndarray, int
+        Experimental and analysis parameters for calculation.
+
+        samp_det_dist: int
+            Distance in mm from the sample to the detector.
+        transm_beam_x: int
+            Location of the incident beam in pixels.
+        transm_beam_y: int
+            Location of the incident beam in pixels.
+        energy_range: np.ndarray(numerical)
+            List of the energy values in keV the user is interested in analyzing
+        q_range: np.ndarray(numerical)
+            List of the momentum transfer values the user is interested in analyzing
+        energy_window_width: int
+            The width in keV of the subranges the user would like to divide thier
+            energy range into.
+
+    Returns
+    -------
+    windows : np.ndarray(numerical)
+        List containing all of the energy windows and their values for later plotting.
+    theta : np.ndarray
+        Each pixel's angular distance from the incident beam
+
+    """
+    # Default Values For Testing With Included Caffiene Data
+    samp_det_dist = kwargs.get(
+        'samp_det_dist') if 'samp_det_dist' in kwargs else 244
+    transm_beam_x_pos = kwargs.get(
+        'transm_beam_x_pos') if 'transm_beam_x_pos' in kwargs else 9
+    transm_beam_y_pos = kwargs.get(
+        'transm_beam_y_pos') if 'transm_beam_y_pos' in kwargs else 1
+    energy_range = kwargs.get(
+        'energy_range') if 'energy_range' in kwargs else np.arange(30, 80)
+    q_range = kwargs.get('q_range') if 'q_range' in kwargs else np.linspace(
+        0.04, 30.04, num=63)
+    energy_window_width = kwargs.get(
+        'energy_window_width') if 'energy_window_width' in kwargs else len(energy_range)
+    num_q_bins = len(q_range)-1
+    # Determine detector shape
+    data_dimensions = np.shape(data_frame.loc[0, 'Image'])
+    theta = np.zeros([data_dimensions[1], data_dimensions[2]])
+    q_image = np.zeros(
+        [data_dimensions[0], data_dimensions[1], data_dimensions[2]])
+
+    split_indicies = np.arange(0, len(energy_range)-1, energy_window_width)
+    # The first index returns an empty list since the first split index matches
+    # the first energy index
+    energy_windows = np.split(energy_range, split_indicies)[1:]
+    data_frame['Spectra'] = None
+    # For each pixel in the detector, find it's angular distance from the incident
+    # beam and the q values it corresponds to across the total energy range collected
+    for x in range(data_dimensions[1]):
+        for y in range(data_dimensions[2]):
+            d = math.sqrt(((x+1)*.25-.25*transm_beam_x_pos) **
+                          2 + ((y+1)*.25-.25*transm_beam_y_pos)**2)
+            theta[y, x] = math.atan(d/samp_det_dist)
+            # TODO alter this to be agnostic of the det file's energy values
+            for e in range(data_dimensions[0]):
+                q_image[e, y, x] = (
+                    4*math.pi*(e+1)*math.sin(theta[y, x]/2))/1.24
+
+    # For each detector file, find the pixels that fall within the q range of
+    # interest and count the number of photons that they encountered.
+    # Repeat for each energy range of interest.
+    for i, detector_image in enumerate(data_frame['Image']):
+        q_counts = np.zeros([len(energy_windows), num_q_bins])
+        for j, window in enumerate(energy_windows):
+            # .hxt files are read in upside down
+            processed_image = detector_image[window, ::-1, :]
+            for k in range(0, num_q_bins):
+                # Find the pixels that fall within this q bin.
+                greater_than_lower_bound = q_image[window] >= q_range[k]
+                lower_than_upper_bound = q_image[window] < q_range[k+1]
+                mask = np.logical_and(greater_than_lower_bound,
+                                      lower_than_upper_bound)
+                if np.sum(mask) != 0:
+                    # Count the number of occurances
+                    q_counts[j, k] = processed_image[mask].sum()
+                else:
+                    q_counts[j, k] = 0
+        data_frame.at[i, 'Spectra'] = q_counts
+    # Energy windows are returned as a dictionary in case they are of uneven length
+    windows = {}
+    for i, x in enumerate(energy_windows):
+        windows[i] = x
+    # Return values for plotting, spectral data is appended to the data frame
+    return windows, theta
+
+
+def bundle_data(raw_files: list):
+    """
+    Constructs a data frame containing the data from each file, in the given
+    order instead of glob order.
+
+    Parameters
+    ----------
+    raw_files : list of str
+        Paths of the .hxt files.
+
+    Returns
+    -------
+    ret_frame : pd.DataFrame
+        Pandas data frame.
+
+    """
+    temp = []
+    for i, file in enumerate(raw_files):
+        # Edit this line for alternative file types: V
+        image, bins = hxtV3Read(file)
+        temp.append({"Image": image, "Energy_Bins_Sampled_By_Detector": bins})
+    ret_frame = pd.DataFrame(temp)
+    return ret_frame
+
+
+def spectral_heatmap(spectra: list, region_to_analyze: np.ndarray, scans_per_row: int):
+    """
+    The map of ScanReconstructionModel.__create_spectral_heatmap(): the area
+    under the first window's spectrum over region_to_analyze of every scan,
+    arranged in a right to left raster with rows of equal width.
+
+    Returns
+    -------
+    ret_image : np.ndarray
+        The reconstructed map.
+    aups : np.ndarray
+        Area under the peak of each scan.
+    """
+    spectra = pd.Series(spectra)
+    ret_image = np.zeros(
+        [math.ceil(len(spectra) / scans_per_row), scans_per_row])
+    aups = np.array(
+        spectra.apply(lambda x: np.trapz(
+            x[0, region_to_analyze])).tolist()
+    )
+    image_height = math.floor(len(aups) / scans_per_row) - 1
+    for i, aup in enumerate(aups):
+        y = i / scans_per_row
+        x = i % scans_per_row
+        if y % 2 < 1:
+            ret_image[image_height - math.floor(y), x] = aup
+        else:
+            ret_image[image_height -
+                      math.floor(y), scans_per_row - 1 - x] = aup
+    return ret_image, aups
+
+
+def window_images(sample_image: np.ndarray, background_image: np.ndarray, windows: list):
+    """
+    The background corrected detector images of EnergyWindowingModel's
+    figures, in the orientation of the raw images (the figures flip them).
+    """
+    bg_corrected_data = sample_image - background_image
+    return [bg_corrected_data[window].sum(axis=0) for window in windows]
@@ -0,0 +1,262 @@
+"""
+Benchmarks of the analysis stages on synthetic .hxt files.
+
+Every case of a grid of detector sizes, energy bin counts, q bin counts and
+file counts writes a synthetic scan (see hxt_writer.py), then times:
+
+    read         hxtV3Read() of one file, copied into memory
+    geometry     DetectorGeometry and its QBinLookup, uncached
+    binning      QBinLookup.reduce() of one in-memory image
+    windowing    window_spectra() of the whole scan into 10 keV windows
+    map          ROI integration and serpentine map of the whole scan
+    extract      stream_spectra() of the whole scan, end to end
+    prefetch     the same with the next 2 files read ahead on threads
+
+Each case runs in its own process so its peak RSS is its own. The report is
+written as JSON and can be compared against a stored baseline report:
+
+    python -m benchmarks.run --output report.json
+    python -m benchmarks.run --quick --output new.json --baseline report.json
+
+Files are timed right after being written, so reads hit the page cache.
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmarks.hxt_writer import write_scan
+from models import scan_map
+from models import sSAXS_tools as s
+from models.geometry import DetectorGeometry, PIXEL_PITCH_mm
+from models.q_binning import window_spectra
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Grid of the full run and of --quick
+DETECTOR_SIZES = (80, 160)
+ENERGY_BINS = (100, 400)
+Q_BINS = (50, 200)
+FILE_COUNTS = (4, 16)
+QUICK_GRID = ((80,), (100,), (50,), (4,))
+
+STAGES = ("read", "geometry", "binning", "windowing", "map", "extract", "prefetch")
+ENERGY_WINDOW_WIDTH = 10
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB, None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def timed(function, *args, **kwargs):
+    """(seconds, result) of one call"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_case(case: dict, repeat: int = 3, mean_counts: float = 0.3,
+             workers: int = 1, data_dir: str = None) -> dict:
+    """
+    Times the stages of one case of the grid.
+
+    Parameters
+    ----------
+    case : dict
+        detector_size, energy_bins, q_bins and files of the case.
+    repeat : int, optional
+        Repetitions of every stage, the median is reported. The default is 3.
+    mean_counts : float, optional
+        Mean count of a detector cell. The default is 0.3.
+    workers : int, optional
+        Processes of the extract stage. The default is 1.
+    data_dir : str, optional
+        Directory of the temporary files, the system's default if None.
+
+    Returns
+    -------
+    dict
+        The case, files_per_s of the extract stage, the median seconds of
+        every stage and the peak RSS in MB.
+    """
+    size, n_bins = case["detector_size"], case["energy_bins"]
+    q_range = np.linspace(0.04, 30.04, num=case["q_bins"] + 1)
+    energy_range = np.arange(n_bins)
+    energy_windows = s.split_energy_range(energy_range, ENERGY_WINDOW_WIDTH)
+    beam = size / 2
+    timings = {stage: [] for stage in STAGES}
+    with tempfile.TemporaryDirectory(dir=data_dir) as directory:
+        files, background = write_scan(directory, case["files"], n_rows=size,
+                                       n_cols=size, n_bins=n_bins, mean_counts=mean_counts)
+        paths = files + [background]
+        for _ in range(repeat):
+            seconds, geometry = timed(
+                lambda: DetectorGeometry((n_bins, size, size), 100.0, beam, beam,
+                                         PIXEL_PITCH_mm, tuple(range(1, n_bins + 1))))
+            lookup_seconds, lookup = timed(geometry.q_bin_lookup, q_range, energy_range)
+            timings["geometry"].append(seconds + lookup_seconds)
+
+            energy_spectra = np.zeros((len(paths), n_bins, lookup.num_q_bins))
+            for i, path in enumerate(paths):
+                seconds, image = timed(lambda: np.array(s.hxtV3Read(path)[0]))
+                timings["read"].append(seconds)
+                seconds, energy_spectra[i] = timed(lookup.reduce, image)
+                timings["binning"].append(seconds)
+                del image
+
+            seconds, spectra = timed(window_spectra, energy_spectra, energy_range,
+                                     energy_windows)
+            timings["windowing"].append(seconds)
+            rois = [np.arange(lookup.num_q_bins // 4, lookup.num_q_bins // 2)]
+            seconds, _ = timed(scan_map.roi_maps, spectra[:-1, 0] - spectra[-1, 0], rois,
+                               max(int(np.ceil(np.sqrt(len(files)))), 1))
+            timings["map"].append(seconds)
+
+            for stage, prefetch in (("extract", 0), ("prefetch", 2)):
+                seconds, _ = timed(
+                    s.stream_spectra, paths, samp_det_dist=100.0, transm_beam_x_pos=beam,
+                    transm_beam_y_pos=beam, energy_range=energy_range, q_range=q_range,
+                    energy_window_width=ENERGY_WINDOW_WIDTH, workers=workers,
+                    prefetch=prefetch, progress=lambda completed, total: None)
+                timings[stage].append(seconds)
+    stages = {stage: statistics.median(values) for stage, values in timings.items()}
+    return {
+        "case": case,
+        "files_per_s": len(paths) / stages["extract"],
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def case_key(case: dict) -> tuple:
+    return (case["detector_size"], case["energy_bins"], case["q_bins"], case["files"])
+
+
+def grid(detector_sizes, energy_bins, q_bins, file_counts) -> list:
+    return [dict(detector_size=size, energy_bins=bins, q_bins=q, files=n)
+            for size, bins, q, n in itertools.product(
+                detector_sizes, energy_bins, q_bins, file_counts)]
+
+
+def run(cases: list, **kwargs) -> dict:
+    """
+    Runs every case in a fresh process, see run_case() for the keyword
+    arguments, and returns the report.
+    """
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for i, case in enumerate(cases):
+        print(f"Case {i+1}/{len(cases)}: {case}", flush=True)
+        with context.Pool(1) as pool:
+            results.append(pool.apply(run_case, (case,), kwargs))
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {key: value for key, value in kwargs.items() if key != "data_dir"},
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Compares the cases found in both reports.
+
+    Parameters
+    ----------
+    report : dict
+        Report of this run, see run().
+    baseline : dict
+        Stored report.
+    tolerance : float, optional
+        Relative slowdown of a stage, or drop of files/s, tolerated before it
+        counts as a regression. The default is 0.2.
+
+    Returns
+    -------
+    list of dict
+        case, metric, baseline, current, ratio (current over baseline time,
+        or baseline over current files/s) and regression of every metric.
+    """
+    baseline_results = {case_key(result["case"]): result for result in baseline["results"]}
+    rows = []
+    for result in report["results"]:
+        previous = baseline_results.get(case_key(result["case"]))
+        if previous is None:
+            continue
+        metrics = [(f"{stage}_s", previous["stages"].get(stage), result["stages"][stage], False)
+                   for stage in STAGES]
+        metrics.append(("files_per_s", previous["files_per_s"], result["files_per_s"], True))
+        for metric, old, new, higher_is_better in metrics:
+            if not old or not new:
+                continue
+            ratio = old / new if higher_is_better else new / old
+            rows.append(dict(case=result["case"], metric=metric, baseline=old, current=new,
+                             ratio=ratio, regression=ratio > 1 + tolerance))
+    return rows
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the analysis stages on synthetic .hxt files.")
+    parser.add_argument("--output", required=True, help="JSON report to write")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative slowdown tolerated against the baseline")
+    parser.add_argument("--quick", action="store_true",
+                        help="Run a single small case instead of the full grid")
+    parser.add_argument("--detector-sizes", type=int, nargs="+")
+    parser.add_argument("--energy-bins", type=int, nargs="+")
+    parser.add_argument("--q-bins", type=int, nargs="+")
+    parser.add_argument("--file-counts", type=int, nargs="+")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mean-counts", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--data-dir", help="Directory of the temporary .hxt files")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    defaults = QUICK_GRID if args.quick else (DETECTOR_SIZES, ENERGY_BINS, Q_BINS, FILE_COUNTS)
+    cases = grid(*(given or default for given, default in zip(
+        (args.detector_sizes, args.energy_bins, args.q_bins, args.file_counts), defaults)))
+    report = run(cases, repeat=args.repeat, mean_counts=args.mean_counts,
+                 workers=args.workers, data_dir=args.data_dir)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    for result in report["results"]:
+        stages = ", ".join(f"{stage} {seconds*1e3:.2f} ms"
+                           for stage, seconds in result["stages"].items())
+        print(f"{result['case']}: {result['files_per_s']:.1f} files/s, {stages}, "
+              f"peak RSS {result['peak_rss_mb']} MB")
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as file:
+        rows = compare(report, json.load(file), args.tolerance)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else "ok"
+        print(f"{flag:10} {row['metric']:14} x{row['ratio']:.2f} {row['case']}")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Startup time of the GUI.
+
+Each run starts a fresh interpreter that imports the startup path of main.py,
+optionally builds and draws the MainWindow, then imports the analysis and
+plotting stack that MainWindow.WARM_UP_MODULES defers to the background:
+
+    startup      imports of windows.main_window, plus the window with --window
+    deferred     imports of the warm up modules, paid off the startup path (with
+                 --window, what the warm up thread has left by then)
+    eager        startup + deferred, the startup time when everything was
+                 imported up front
+
+The modules in HEAVY_MODULES must not be loaded by the startup path, the exit
+code is 1 if one is:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --window --output startup.json
+
+Imports are timed warm, i.e. after the first run compiled the bytecode.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only the analysis and its figures need
+HEAVY_MODULES = ("matplotlib", "pandas", "mpl_toolkits.mplot3d", "numpy")
+
+# Run in a fresh interpreter, prints its timings as JSON
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from windows.main_window import MainWindow
+if {window}:
+    window = MainWindow()
+# Checked before drawing the window starts the warm up
+loaded = [module for module in {heavy!r} if module in sys.modules]
+if {window}:
+    window.root.update()
+startup = time.perf_counter() - start
+start = time.perf_counter()
+for module in MainWindow.WARM_UP_MODULES:
+    __import__(module)
+deferred = time.perf_counter() - start
+if {window}:
+    window.root.destroy()
+print(json.dumps(dict(startup=startup, deferred=deferred, loaded=loaded)))
+"""
+
+
+def probe(window: bool = False) -> dict:
+    """Timings of one fresh interpreter, see _PROBE"""
+    process = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(window=window, heavy=HEAVY_MODULES)],
+        cwd=REPOSITORY, capture_output=True, text=True)
+    if process.returncode:
+        raise SystemExit(f"Startup probe failed:\n{process.stderr}")
+    # The analysis modules may print, the timings are the last line
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def run(repeat: int = 5, window: bool = False) -> dict:
+    """
+    Median timings of repeat fresh interpreters.
+
+    Parameters
+    ----------
+    repeat : int, optional
+        Interpreters started after a first untimed one. The default is 5.
+    window : bool, optional
+        Whether the MainWindow is built and drawn, which needs a display. The
+        default is False.
+
+    Returns
+    -------
+    dict
+        startup_s, deferred_s, eager_s, speedup (eager over startup) and
+        heavy_modules_at_startup.
+    """
+    # Compiles the bytecode of every module
+    probe(window)
+    probes = [probe(window) for _ in range(repeat)]
+    startup = statistics.median(result["startup"] for result in probes)
+    deferred = statistics.median(result["deferred"] for result in probes)
+    return {
+        "window": window,
+        "startup_s": startup,
+        "deferred_s": deferred,
+        "eager_s": startup + deferred,
+        "speedup": (startup + deferred) / startup,
+        "heavy_modules_at_startup": sorted(
+            {module for result in probes for module in result["loaded"]}),
+    }
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Time the startup of the GUI.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--window", action="store_true",
+                        help="Also build and draw the MainWindow, needs a display")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    report = run(args.repeat, args.window)
+    print(f"startup {report['startup_s']*1e3:.0f} ms, deferred {report['deferred_s']*1e3:.0f} ms, "
+          f"eager {report['eager_s']*1e3:.0f} ms (x{report['speedup']:.1f})")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if report["heavy_modules_at_startup"]:
+        print("Loaded at startup: " + ", ".join(report["heavy_modules_at_startup"]))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
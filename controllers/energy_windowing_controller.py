@@ -1,12 +1,17 @@
 from binascii import Incomplete
 import tkinter as tk
 from tkinter.filedialog import askopenfile
-from typing import IO, Callable, Dict
+from typing import TYPE_CHECKING, IO, Callable, Dict
 from enum import Enum
 from pathlib import Path
-from models import EnergyWindowingModel
+from models.figure_set import FigureSet
+from models.telemetry import Telemetry, format_report
+from utils.background import BackgroundTask
 from controllers import GlobalParametersController
 
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
 """
 Data controller for the Energy Windowing Frame. This file 
 """
@@ -37,6 +42,10 @@ class EnergyWindowingController:
         self._selected_bg_file_path: str | None = None
         self._selected_sample_file_path: str | None = None
         self._validated_inputs: Dict[str, bool] = {}
+        self._task: BackgroundTask | None = None
+        # Redrawn by every analysis, so resubmitting reuses the embedded figures
+        self._figures = FigureSet()
+        self._profile = tk.BooleanVar(self.parent_frame, False)
 
     @property
     def energy_range_min(self):
@@ -74,6 +83,11 @@ class EnergyWindowingController:
     def energy_window_width(self, value: int):
         self._energy_window_width.set(value)
 
+    @property
+    def profile(self):
+        """Whether the stages of the next analysis are profiled"""
+        return self._profile
+
     def are_all_valid(self) -> bool:
         """Whether every input that is meant to be validated is valid"""
         if not self._validated_inputs:
@@ -248,7 +262,15 @@ class EnergyWindowingController:
         else:
             self._validated_inputs[validation_key] = False
 
-    def submit(self):
+    def submit(
+        self,
+        show_progress: Callable[[int, int], None],
+        show_running: Callable[[bool, str], None],
+        show_figures: Callable[[Dict[str, "Figure"]], None],
+        show_report: Callable[[str], None],
+    ):
+        if self._task is not None and self._task.is_running:
+            return
         print("energy window plotting...")
         print(
             f"Energy: {self._energy_min.get()} - {self._energy_max.get()} \
@@ -257,6 +279,9 @@ class EnergyWindowingController:
             \nBackground File: {self._selected_bg_file_path} \
             \nSample File: {self._selected_sample_file_path}"
         )
+        # Imported on the first submit, the analysis stack is not loaded at startup
+        from models import EnergyWindowingModel
+
         data = {
             EnergyWindowingModel.Property.ENERGY_RANGE_MIN: self._energy_min.get(),
             EnergyWindowingModel.Property.ENERGY_RANGE_MAX: self._energy_max.get(),
@@ -271,4 +296,28 @@ class EnergyWindowingController:
             EnergyWindowingModel.Property.TRANSMISSION_BEAM_Y: self.global_params_controller.transmission_beam_y.get(),
         }
         model = EnergyWindowingModel(data=data)
-        model.plot_windowing_figures()
+        model.telemetry = Telemetry(enabled=self._profile.get())
+
+        def on_done(_):
+            # Figures are created on the Tk thread once the analysis finished
+            model.plot(self._figures)
+            show_figures(model.figures)
+            if model.telemetry.enabled:
+                show_report(format_report(model.telemetry.report()))
+            show_running(False, "Finished")
+
+        self._task = BackgroundTask(
+            self.parent_frame,
+            model.analyze,
+            on_progress=show_progress,
+            on_done=on_done,
+            on_cancelled=lambda: show_running(False, "Cancelled"),
+            on_error=lambda error: show_running(False, f"Failed: {error}"),
+        )
+        show_running(True, "Running...")
+        self._task.start()
+
+    def cancel(self):
+        """Stops the running analysis after the file being processed"""
+        if self._task is not None:
+            self._task.cancel()
@@ -1,12 +1,17 @@
 import tkinter as tk
 import cmath
 from tkinter.filedialog import askopenfile, askdirectory
-from typing import IO, Callable, Dict, List
+from typing import TYPE_CHECKING, IO, Callable, Dict, List
 from binascii import Incomplete
 from pathlib import Path
-from models import ScanReconstructionModel
+from models.figure_set import FigureSet
+from models.telemetry import Telemetry, format_report
+from utils.background import BackgroundTask
 from controllers import GlobalParametersController
-from os import listdir, path
+from os import cpu_count, listdir, path
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
 
 
 """
@@ -24,6 +29,9 @@ class ScanReconstructionController:
         SCAN_WIDTH_MIN,
     )
     DEFAULT_SAMPLE_FILE_EXTENSION = ".hxt"
+    # One worker reduces the files in the app's process, reading the next ones
+    # ahead on threads. More start a process pool, which pays off on large scans
+    WORKERS_DEFAULT, WORKERS_MAX = 1, cpu_count() or 1
     ENERGY_RANGE_MIN, ENERGY_RANGE_MAX = 0, 1000
     ENERGY_RANGE_DEFAULT_MIN, ENERGY_RANGE_DEFAULT_MAX = ENERGY_RANGE_MIN, 100
 
@@ -50,6 +58,11 @@ class ScanReconstructionController:
         self._selected_bg_file_path: str | None = None
         self._selected_sample_directory: str | None = None
         self._validated_inputs: Dict[str, bool] = {}
+        self._task: BackgroundTask | None = None
+        # Redrawn by every analysis, so resubmitting reuses the embedded figures
+        self._figures = FigureSet()
+        self._profile = tk.BooleanVar(self.parent_frame, False)
+        self._workers = tk.IntVar(self.parent_frame, self.WORKERS_DEFAULT)
 
     """
     Methods to set and retrieve values from the user input frames
@@ -112,6 +125,20 @@ class ScanReconstructionController:
     def file_extension_options(self) -> List[str]:
         return [".hxt", ".txt"]
 
+    @property
+    def workers(self):
+        """The number of processes reducing the scan files"""
+        return self._workers
+
+    @workers.setter
+    def workers(self, value: int):
+        self._workers.set(value)
+
+    @property
+    def profile(self):
+        """Whether the stages of the next analysis are profiled"""
+        return self._profile
+
     def are_all_valid(self) -> bool:
         """Whether every input that is meant to be validated is valid"""
         if not self._validated_inputs:
@@ -344,7 +371,15 @@ class ScanReconstructionController:
         else:
             self._validated_inputs[validation_key] = False
 
-    def submit(self):
+    def submit(
+        self,
+        show_progress: Callable[[int, int], None],
+        show_running: Callable[[bool, str], None],
+        show_figures: Callable[[Dict[str, "Figure"]], None],
+        show_report: Callable[[str], None],
+    ):
+        if self._task is not None and self._task.is_running:
+            return
         print("scan reconstruction window plotting...")
         print(
             f"q Range: {self._integral_q_start.get()} - {self._integral_q_end.get()} \
@@ -354,6 +389,9 @@ class ScanReconstructionController:
             \nSample Directory: {self._selected_sample_directory} \
             \nFile extension: {self._selected_file_extension.get()}"
         )
+        # Imported on the first submit, the analysis stack is not loaded at startup
+        from models import ScanReconstructionModel
+
         data = {
             ScanReconstructionModel.Property.ENERGY_RANGE_MIN: self._energy_min.get(),
             ScanReconstructionModel.Property.ENERGY_RANGE_MAX: self._energy_max.get(),
@@ -368,7 +406,32 @@ class ScanReconstructionController:
             ScanReconstructionModel.Property.q_END: self.global_params_controller.q_end.get(),
             ScanReconstructionModel.Property.TRANSMISSION_BEAM_X: self.global_params_controller.transmission_beam_x.get(),
             ScanReconstructionModel.Property.TRANSMISSION_BEAM_Y: self.global_params_controller.transmission_beam_y.get(),
+            ScanReconstructionModel.Property.WORKERS: self._workers.get(),
         }
 
         model = ScanReconstructionModel(data=data)
-        model.reconstruct_scan()
+        model.telemetry = Telemetry(enabled=self._profile.get())
+
+        def on_done(_):
+            # Figures are created on the Tk thread once the analysis finished
+            model.plot(self._figures)
+            show_figures(model.figures)
+            if model.telemetry.enabled:
+                show_report(format_report(model.telemetry.report()))
+            show_running(False, "Finished")
+
+        self._task = BackgroundTask(
+            self.parent_frame,
+            model.analyze,
+            on_progress=show_progress,
+            on_done=on_done,
+            on_cancelled=lambda: show_running(False, "Cancelled"),
+            on_error=lambda error: show_running(False, f"Failed: {error}"),
+        )
+        show_running(True, "Running...")
+        self._task.start()
+
+    def cancel(self):
+        """Stops the running analysis after the file being processed"""
+        if self._task is not None:
+            self._task.cancel()
@@ -24,7 +24,8 @@ class EnergyWindowingFrame(BaseFrame):
             row=0, column=0, rowspan=2, pady=10, padx=10, sticky="ns")
         self.global_params_frame.anchor("center")
         self.frame_scan_data_section()
-        self.frame_binning_section()
+        figures_notebook = self.frame_figures_section()
+        self.frame_binning_section(figures_notebook)
         self.show_example()
 
     def frame_scan_data_section(self):
@@ -97,7 +98,17 @@ class EnergyWindowingFrame(BaseFrame):
         )
         sample_file_picker.grid(row=2, column=1, sticky="e", pady=10, padx=10)
 
-    def frame_binning_section(self):
+    def frame_figures_section(self) -> ttk.Notebook:
+        # Figures of the last analysis, one tab each, hidden until the first one
+        figures_notebook = ttk.Notebook(self)
+        figures_notebook.grid(row=0, column=2, rowspan=4, sticky="nsew",
+                              pady=10, padx=10)
+        figures_notebook.grid_remove()
+        self.grid_columnconfigure(2, weight=1)
+        self.grid_rowconfigure(3, weight=1)
+        return figures_notebook
+
+    def frame_binning_section(self, figures_notebook: ttk.Notebook):
         # Label frame
         binning_section = ttk.LabelFrame(self, text="Binning")
         binning_section.grid(row=1, column=1, sticky="ew",
@@ -236,13 +247,30 @@ class EnergyWindowingFrame(BaseFrame):
         energy_window_width_entry.grid(
             row=4, column=1, sticky="e", padx=10, pady=10)
 
+        # Profiles the stages of the next analysis, shown in a tab of the figures
+        profile_checkbutton = ttk.Checkbutton(
+            binning_section, text="Profile run", variable=self.controller.profile)
+        profile_checkbutton.grid(row=5, column=1, columnspan=3, sticky="e", padx=10)
+
+        show_figures = WidgetUtils.show_figures(figures_notebook)
+        show_report = WidgetUtils.show_report(figures_notebook)
+
         # Submit / Plot button
         plot_button = ttk.Button(
             binning_section,
             text="Generate Plot",
             style="Accent.TButton",
             padding=[10, 5, 10, 5],
-            command=self.controller.submit,
+            command=(
+                lambda: self.controller.submit(
+                    WidgetUtils.show_progress(progress_bar, status_label),
+                    WidgetUtils.show_running(
+                        plot_button, cancel_button, progress_bar, status_label
+                    ),
+                    show_figures,
+                    show_report,
+                )
+            ),
         )
         button_disable_state = (
             "!disabled" if self.controller.are_all_valid else "disabled"
@@ -253,6 +281,25 @@ class EnergyWindowingFrame(BaseFrame):
         plot_button.grid(row=6, column=0, columnspan=4,
                          sticky="ew", pady=10, padx=10)
 
+        # Analysis progress bar
+        progress_bar = ttk.Progressbar(binning_section, mode="determinate")
+        progress_bar.grid(row=7, column=0, columnspan=3,
+                          sticky="ew", pady=10, padx=10)
+
+        # Cancel button (only enabled while an analysis is running)
+        cancel_button = ttk.Button(
+            binning_section,
+            text="Cancel",
+            padding=[10, 5, 10, 5],
+            command=self.controller.cancel,
+        )
+        cancel_button.state(["disabled"])
+        cancel_button.grid(row=7, column=3, sticky="e", pady=10, padx=10)
+
+        # Analysis status label
+        status_label = ttk.Label(binning_section, text="")
+        status_label.grid(row=8, column=0, columnspan=4, sticky="w", padx=10)
+
         self.controller.register_submit_validation_refresh(
             WidgetUtils.disable_on_invalidation(
                 plot_button, self.controller.are_all_valid
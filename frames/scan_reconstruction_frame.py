@@ -33,7 +33,9 @@ class ScanReconstructionFrame(BaseFrame):
         self.setup_energy_range(params_frame)
         self.setup_integral_q_range(params_frame)
         self.setup_scan_width(params_frame)
-        self.setup_submit(params_frame)
+        self.setup_workers(params_frame)
+        figures_notebook = self.setup_figures_frame()
+        self.setup_submit(params_frame, figures_notebook)
 
     def setup_scan_data_frame(self):
 
@@ -289,14 +291,57 @@ class ScanReconstructionFrame(BaseFrame):
         )
         scan_width_entry.grid(row=4, column=1, sticky="e", pady=10)
 
-    def setup_submit(self, frame: tk.LabelFrame):
+    def setup_workers(self, frame: tk.LabelFrame):
+        # Workers label
+        workers_label = ttk.Label(frame, text="Workers")
+        workers_label.grid(row=4, column=2, sticky="e", pady=10, padx=10)
+
+        # Workers spinbox, read only so it always holds a valid count
+        workers_spinbox = ttk.Spinbox(
+            frame,
+            width=3,
+            from_=1,
+            to=self.controller.WORKERS_MAX,
+            textvariable=self.controller.workers,
+            state="readonly",
+        )
+        workers_spinbox.grid(row=4, column=3, sticky="e", pady=10)
+
+    def setup_figures_frame(self) -> ttk.Notebook:
+        # Figures of the last analysis, one tab each, hidden until the first one
+        figures_notebook = ttk.Notebook(self)
+        figures_notebook.grid(row=0, column=2, rowspan=4, sticky="nsew",
+                              pady=10, padx=10)
+        figures_notebook.grid_remove()
+        self.grid_columnconfigure(2, weight=1)
+        self.grid_rowconfigure(3, weight=1)
+        return figures_notebook
+
+    def setup_submit(self, frame: tk.LabelFrame, figures_notebook: ttk.Notebook):
+        # Profiles the stages of the next analysis, shown in a tab of the figures
+        profile_checkbutton = ttk.Checkbutton(
+            frame, text="Profile run", variable=self.controller.profile)
+        profile_checkbutton.grid(row=5, column=1, columnspan=3, sticky="e", padx=10)
+
+        show_figures = WidgetUtils.show_figures(figures_notebook)
+        show_report = WidgetUtils.show_report(figures_notebook)
+
         # Submit / Plot button
         plot_button = ttk.Button(
             frame,
             text="Generate Plot",
             style="Accent.TButton",
             padding=[10, 5, 10, 5],
-            command=self.controller.submit,
+            command=(
+                lambda: self.controller.submit(
+                    WidgetUtils.show_progress(progress_bar, status_label),
+                    WidgetUtils.show_running(
+                        plot_button, cancel_button, progress_bar, status_label
+                    ),
+                    show_figures,
+                    show_report,
+                )
+            ),
         )
         button_disable_state = (
             "!disabled" if self.controller.are_all_valid else "disabled"
@@ -307,6 +352,25 @@ class ScanReconstructionFrame(BaseFrame):
         plot_button.grid(row=6, column=0, columnspan=4,
                          sticky="ew", pady=10, padx=10)
 
+        # Analysis progress bar
+        progress_bar = ttk.Progressbar(frame, mode="determinate")
+        progress_bar.grid(row=7, column=0, columnspan=3,
+                          sticky="ew", pady=10, padx=10)
+
+        # Cancel button (only enabled while an analysis is running)
+        cancel_button = ttk.Button(
+            frame,
+            text="Cancel",
+            padding=[10, 5, 10, 5],
+            command=self.controller.cancel,
+        )
+        cancel_button.state(["disabled"])
+        cancel_button.grid(row=7, column=3, sticky="e", pady=10, padx=10)
+
+        # Analysis status label
+        status_label = ttk.Label(frame, text="")
+        status_label.grid(row=8, column=0, columnspan=4, sticky="w", padx=10)
+
         self.controller.register_submit_validation_refresh(
             WidgetUtils.disable_on_invalidation(
                 plot_button, self.controller.are_all_valid
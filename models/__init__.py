@@ -1,3 +1,37 @@
-from .energy_windowing_model import EnergyWindowingModel
-from .scan_reconstruction_model import ScanReconstructionModel
-from .sSAXS_tools import bundle_data, create_spectral_heatmap, extract_spectra
+"""
+The analysis models and tools. The submodules load numpy, pandas and
+matplotlib, so the names below are imported on first access rather than with
+the package, which keeps the GUI's startup from waiting on them.
+"""
+
+import importlib
+
+# Submodule of every name exported by the package
+_EXPORTS = {
+    "EnergyWindowingModel": "energy_windowing_model",
+    "ScanReconstructionModel": "scan_reconstruction_model",
+    "ScanDataset": "scan_dataset",
+    "bundle_data": "sSAXS_tools",
+    "create_spectral_heatmap": "sSAXS_tools",
+    "extract_spectra": "sSAXS_tools",
+    "rewindow_spectra": "sSAXS_tools",
+    "stream_spectra": "sSAXS_tools",
+    "HxtCatalog": "hxt_catalog",
+    "SpectraCache": "spectra_cache",
+    "FigureSet": "figure_set",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    # Later accesses find it directly
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
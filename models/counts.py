@@ -0,0 +1,48 @@
+"""
+Lossless compact storage of detector counts.
+
+.hxt files store photon counts as float64 although they are integers, so they
+usually fit in uint16 or uint32 without any loss. Floating point types are only
+kept for data that is not integral or too large.
+"""
+
+import numpy as np
+
+# Candidate types, from the most to the least compact
+COUNT_DTYPES = (np.dtype(np.uint16), np.dtype(np.uint32),
+                np.dtype(np.float32), np.dtype(np.float64))
+
+
+def compact_dtype(array: np.ndarray) -> np.dtype:
+    """
+    The smallest of COUNT_DTYPES that holds every value of array exactly.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        Counts of any numerical type.
+
+    Returns
+    -------
+    np.dtype
+        uint16 or uint32 for non-negative integral values in range, otherwise
+        float32 if it represents every value, otherwise float64.
+    """
+    array = np.asarray(array)
+    if array.size == 0:
+        return COUNT_DTYPES[0]
+    low, high = array.min(), array.max()
+    integral = array.dtype.kind in "ui" or (
+        np.isfinite(low) and np.isfinite(high) and np.array_equal(array, np.trunc(array)))
+    if integral and low >= 0:
+        for dtype in COUNT_DTYPES[:2]:
+            if high <= np.iinfo(dtype).max:
+                return dtype
+    if np.array_equal(array.astype(np.float32), array, equal_nan=True):
+        return COUNT_DTYPES[2]
+    return COUNT_DTYPES[3]
+
+
+def compact(array: np.ndarray) -> np.ndarray:
+    """array converted to compact_dtype(array), not copied if already compact"""
+    return np.asarray(array).astype(compact_dtype(array), copy=False)
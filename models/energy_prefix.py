@@ -0,0 +1,59 @@
+"""
+Cumulative sum along the energy axis of a detector cube.
+
+The image of any contiguous energy window is then the difference of two
+slices of the cumulative sum, so its cost only depends on the number of pixels,
+not on the width of the window.
+"""
+
+import numpy as np
+
+
+class EnergyPrefixSum:
+    """
+    prefix[k] holds the sum of the cube's first k energies, starting at
+    first_energy, so the sum of energies a..b is prefix[b+1] - prefix[a].
+    """
+
+    def __init__(self, cube: np.ndarray, first_energy: int):
+        """
+        Parameters
+        ----------
+        cube : np.ndarray
+            [energy, col, row] counts of the consecutive energies starting at
+            first_energy, e.g. a background corrected detector image.
+        first_energy : int
+            Energy index of the cube's first row.
+        """
+        self.first_energy = first_energy
+        self.prefix = np.zeros((len(cube) + 1,) + cube.shape[1:])
+        np.cumsum(cube, axis=0, dtype=np.float64, out=self.prefix[1:])
+
+    @property
+    def last_energy(self) -> int:
+        return self.first_energy + len(self.prefix) - 2
+
+    def window_image(self, energies: np.ndarray) -> np.ndarray:
+        """
+        [col, row] sum of the given energies, like cube[energies].sum(axis=0).
+
+        Parameters
+        ----------
+        energies : np.ndarray
+            Energy indices within first_energy..last_energy. Consecutive
+            energies take two slices, others one per energy.
+
+        Returns
+        -------
+        np.ndarray
+            The summed image.
+        """
+        rows = np.asarray(energies, dtype=np.intp) - self.first_energy
+        if len(rows) == 0:
+            return np.zeros(self.prefix.shape[1:])
+        if rows.min() < 0 or rows.max() > len(self.prefix) - 2:
+            raise ValueError(
+                f"Energies outside of {self.first_energy}-{self.last_energy}")
+        if np.all(np.diff(rows) == 1):
+            return self.prefix[rows[-1] + 1] - self.prefix[rows[0]]
+        return np.sum(self.prefix[rows + 1] - self.prefix[rows], axis=0)
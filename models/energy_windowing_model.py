@@ -1,11 +1,13 @@
 from enum import Enum
-from typing import Dict
+from typing import Callable, Dict
 import numpy as np
-from models import sSAXS_tools as s
-import pandas as pd
-from matplotlib import pyplot as plt
-from utils import PlotUtils
-import math
+from models import rendering, sSAXS_tools as s
+from models.energy_prefix import EnergyPrefixSum
+from models.scan_dataset import ScanDataset
+from models.figure_set import FigureSet
+from models.telemetry import NO_TELEMETRY, Telemetry
+from matplotlib.widgets import RangeSlider
+import glob
 
 
 class EnergyWindowingModel:
@@ -22,12 +24,16 @@ class EnergyWindowingModel:
         q_END = "global_q_end"
         TRANSMISSION_BEAM_X = "transmission_beam_x"
         TRANSMISSION_BEAM_Y = "transmission_beam_y"
+        SPARSE_FRAMES = "sparse_frames"
+        SHARED_COLORBAR = "shared_colorbar"
 
     def __init__(self, data: Dict[Property, object]):
 
+        self.energy_range_min = data.get(self.Property.ENERGY_RANGE_MIN)
+        self.energy_range_max = data.get(self.Property.ENERGY_RANGE_MAX)
         self.energy_range = np.arange(
-            data.get(self.Property.ENERGY_RANGE_MIN),
-            data.get(self.Property.ENERGY_RANGE_MAX)+1,
+            self.energy_range_min,
+            self.energy_range_max+1,
             data.get(self.Property.BIN_WIDTH),
             dtype=int,
         )
@@ -43,145 +49,160 @@ class EnergyWindowingModel:
         )
         self.transmission_beam_x = data.get(self.Property.TRANSMISSION_BEAM_X)
         self.transmission_beam_y = data.get(self.Property.TRANSMISSION_BEAM_Y)
-        self.dataframe = pd.DataFrame()
+        # Keeps only the nonzero detector cells, for low count data
+        self.sparse_frames = data.get(self.Property.SPARSE_FRAMES, False)
+        # Draws the window images on one count scale, otherwise each on its own
+        self.shared_colorbar = data.get(self.Property.SHARED_COLORBAR, True)
+        self.dataset: ScanDataset = None
         self.windows: np.ndarray = None
         self.theta: np.ndarray = None
-        self.figures = {}
+        self.figures = FigureSet()
+        # Spans of analyze() and plot(), replaced by an enabled Telemetry to profile
+        self.telemetry: Telemetry = NO_TELEMETRY
+        self._energy_prefix: EnergyPrefixSum = None
 
-    def plot_windowing_figures(self):
-        sample_data = s.bundle_data(self.sample_file_path)
-        background_data = s.bundle_data(self.background_file_path)
-        self.data_frame = pd.concat(
-            [sample_data, background_data], ignore_index=True)
-        self.windows, self.theta = s.extract_spectra(
-            self.data_frame,
-            samp_det_dist=self.detector_distance,
-            transm_beam_x_pos=self.transmission_beam_x,
-            transm_beam_y_pos=self.transmission_beam_y,
-            energy_range=self.energy_range,
-            q_range=self.q_range,
-            energy_window_width=self.energy_window_width)
+    def plot_windowing_figures(self) -> FigureSet:
+        self.analyze()
+        self.plot()
+        print("Finish")
+        return self.figures
 
-        spectra = pd.Series(self.data_frame["Spectra"])
+    def analyze(self, progress: Callable[[int, int], None] = None):
         """
-        Plotting
+        Reads the sample and background files and extracts their spectra. No
+        figures are created, so this can run off the Tk thread.
+
+        Parameters
+        ----------
+        progress : Callable[[int, int], None], optional
+            Called with (files completed, total files), see extract_spectra().
         """
-        self.figures["window_3d"] = self.__plot_3d_spectra()
-        self.figures["detector_images_windowed"] = self.__plot_windowed_det_images()
-        self.figures["detector_image"] = self.__plot_det_image()
-        self.figures["theta_map"] = self.__plot_theta()
-        self.figures["bg_sub_plot"] = self.__plot_bg_sub_spectrum()
-        self.figures["spectra"] = self.__plot_spectra()
-        plt.show(block=False)
-        print("Finish")
+        # The background file follows the sample in one array of images, with
+        # the counts stored losslessly in the smallest type that holds them
+        with self.telemetry.span("bundle_data"):
+            self.dataset = s.bundle_data(
+                glob.glob(self.sample_file_path) + glob.glob(self.background_file_path),
+                compact=True, sparse=self.sparse_frames)
+        self._energy_prefix = None
+        with self.telemetry.span("extract_spectra"):
+            self.windows, self.theta = s.extract_spectra(
+                self.dataset,
+                samp_det_dist=self.detector_distance,
+                transm_beam_x_pos=self.transmission_beam_x,
+                transm_beam_y_pos=self.transmission_beam_y,
+                energy_range=self.energy_range,
+                q_range=self.q_range,
+                energy_window_width=self.energy_window_width,
+                # Every energy of the range is resolved, whatever the bin width, so
+                # rewindow() can change both
+                energies=np.arange(self.energy_range_min, self.energy_range_max+1),
+                progress=progress,
+                telemetry=self.telemetry)
+
+    def rewindow(self, energy_window_width: int = None, bin_width: int = None):
+        """
+        Changes the energy windows after analyze() by summing the energy
+        resolved spectra, without rereading or rebinning the detector data.
+        Call plot() afterwards to update the figures.
+
+        Parameters
+        ----------
+        energy_window_width : int, optional
+            New width of the energy windows, keeps the current one if None.
+        bin_width : int, optional
+            New step between the energies of the range, keeps the current one
+            if None.
+
+        Returns
+        -------
+        None.
+
+        """
+        if energy_window_width is not None:
+            self.energy_window_width = energy_window_width
+        if bin_width is not None:
+            self.energy_range = np.arange(
+                self.energy_range_min, self.energy_range_max+1, bin_width, dtype=int)
+        self.windows = s.rewindow_spectra(
+            self.dataset, self.energy_range, self.energy_window_width)
+
+    def plot(self, figures: FigureSet = None):
+        """
+        Draws the figures from the results of analyze(). Must run on the
+        thread that owns the GUI.
+
+        Parameters
+        ----------
+        figures : FigureSet, optional
+            Figures of a previous analysis to redraw, e.g. the ones embedded
+            in the GUI. New figures are created if None.
+        """
+        if figures is not None:
+            self.figures = figures
+        plots = {
+            "window_3d": self.__plot_3d_spectra,
+            "detector_images_windowed": self.__plot_windowed_det_images,
+            "detector_image": self.__plot_det_image,
+            "theta_map": self.__plot_theta,
+            "bg_sub_plot": self.__plot_bg_sub_spectrum,
+            "spectra": self.__plot_spectra,
+            "window_explorer": self.__plot_window_explorer,
+        }
+        with self.telemetry.span("plot"):
+            for key, plot in plots.items():
+                with self.telemetry.span(key):
+                    plot()
+
+    def window_image(self, energies: np.ndarray) -> np.ndarray:
+        """
+        Background corrected detector image summed over the given energies,
+        in the orientation of the raw images.
+
+        The first call computes the cumulative sum over the energy range of the
+        background corrected cube, after which every image costs two slices
+        whatever the number of energies.
+
+        Parameters
+        ----------
+        energies : np.ndarray
+            Energy indices within the energy range, e.g. one of self.windows.
+
+        Returns
+        -------
+        np.ndarray
+            [col, row] counts.
+        """
+        if self._energy_prefix is None:
+            stop = self.energy_range_max + 1
+            with self.telemetry.span("energy_prefix"):
+                # Taken as float64, so compact unsigned counts cannot wrap around
+                bg_corrected_data = self.dataset.energy_slab(
+                    0, self.energy_range_min, stop) - self.dataset.energy_slab(
+                    1, self.energy_range_min, stop)
+                self._energy_prefix = EnergyPrefixSum(
+                    bg_corrected_data, self.energy_range_min)
+        return self._energy_prefix.window_image(energies)
 
     def __plot_windowed_det_images(self):
-        nTimes = len(self.windows)
-        fig = plt.figure()
-        if math.floor(math.sqrt(nTimes)) == math.ceil(math.sqrt(nTimes)):
-            xlen = int(math.sqrt(nTimes))
-            # Changing Size depending on how many graphs are going to be made
-            if xlen >= 3:
-                fig, axs = plt.subplots(
-                    xlen,
-                    xlen,
-                    figsize=(xlen * 2 + 1, xlen * 2),
-                    sharex="all",
-                    squeeze=False,
-                )
-            elif xlen >= 5:
-                fig, axs = plt.subplots(
-                    xlen, xlen, figsize=(xlen + 1, xlen), sharex="all", squeeze=False
-                )
-            else:
-                fig, axs = plt.subplots(
-                    xlen, xlen, figsize=(7, 6), sharex="all", squeeze=False
-                )
-        else:
-            xlen = int(math.sqrt(nTimes)) + 1
-            # Delete row if completely unused
-            if 1 + (xlen - 1) * xlen > nTimes:
-                if xlen >= 3:
-                    fig, axs = plt.subplots(
-                        xlen - 1,
-                        xlen,
-                        figsize=(xlen * 2 + 1, (xlen - 1) * 2),
-                        sharex="all",
-                        squeeze=False,
-                    )
-                elif xlen >= 5:
-                    fig, axs = plt.subplots(
-                        xlen - 1,
-                        xlen,
-                        figsize=(xlen + 1, xlen - 1),
-                        sharex="all",
-                        squeeze=False,
-                    )
-                else:
-                    fig, axs = plt.subplots(
-                        xlen - 1, xlen, figsize=(7, 6), sharex="all", squeeze=False
-                    )
-            else:
-                if xlen >= 3:
-                    fig, axs = plt.subplots(
-                        xlen,
-                        xlen,
-                        figsize=(xlen * 2 + 1, xlen * 2),
-                        sharex="all",
-                        squeeze=False,
-                    )
-                elif xlen >= 5:
-                    fig, axs = plt.subplots(
-                        xlen,
-                        xlen,
-                        figsize=(xlen + 1, xlen),
-                        sharex="all",
-                        squeeze=False,
-                    )
-                else:
-                    fig, axs = plt.subplots(
-                        xlen, xlen, figsize=(7, 6), sharex="all", squeeze=False
-                    )
-        # Delete blank axes where there are no graphs and break out of the for loop if the row was deleted
-        yPosition = 0
-        bg_corrected_data = self.data_frame.at[0,
-                                               "Image"] - self.data_frame.at[1, "Image"]
-        for k in range(0, xlen):
-            try:
-                if (k + 1) + (xlen - 2) * xlen > nTimes:
-                    axs[xlen - 2][k].set_axis_off()
-                if (k + 1) + (xlen - 1) * xlen > nTimes:
-                    axs[xlen - 1][k].set_axis_off()
-            except:
-                break
-        for x, key in enumerate(self.windows):
-            window = self.windows[key]
-            if x >= xlen * (yPosition + 1):
-                yPosition += 1
-            image = axs[yPosition][x - xlen * yPosition].pcolormesh(
-                np.flipud(bg_corrected_data[window].sum(axis=0)), cmap="jet", vmin=0)
-            axs[yPosition][x - xlen * yPosition].set_title(
-                str(window[0]) + "-" + str(window[-1]) + " keV", fontweight="bold")
-            bar = plt.colorbar(image, ax=axs[yPosition][x - xlen * yPosition])
-            bar.set_label("Counts", rotation=270, fontsize=10, labelpad=15)
-            axs[yPosition][x - xlen * yPosition].get_xaxis().set_visible(False)
-            axs[yPosition][x - xlen * yPosition].get_yaxis().set_visible(False)
+        rows, columns = rendering.grid_shape(len(self.windows))
+        # Changing Size depending on how many graphs are going to be made
+        figsize = (columns * 2 + 1, rows * 2) if columns >= 3 else (7, 6)
+        fig = self.figures.figure("detector_images_windowed", figsize=figsize)
+        ax = fig.add_subplot()
+        rendering.show_mosaic(
+            fig, ax,
+            [self.window_image(window) for window in self.windows.values()],
+            [f"{window[0]}-{window[-1]} keV" for window in self.windows.values()],
+            shared_colorbar=self.shared_colorbar)
         fig.tight_layout()
         return fig
 
     def __plot_det_image(self):
-        bg_corrected_data = (
-            self.data_frame.at[0, "Image"] - self.data_frame.at[1, "Image"]
-        )
-        bg_corrected_data = bg_corrected_data[self.energy_range, :, :]
-        bg_corrected_data = np.flipud(bg_corrected_data.sum(axis=0))
-        fig = plt.figure()
+        fig = self.figures.figure("detector_image")
         ax = fig.add_subplot()
-        mesh = ax.pcolormesh(bg_corrected_data, cmap="jet", vmin=0)
-        fig.colorbar(mappable=mesh, cmap="jet",
-                     label="Counts", orientation="vertical")
+        rendering.show_image(fig, ax, self.window_image(self.energy_range), label="Counts")
         ax.set_aspect(1.0 / ax.get_data_ratio(), adjustable="box")
-        # plt.title(
+        # ax.set_title(
         #     "Background Corrected ("
         #     + str(self.energy_range[0])
         #     + "-"
@@ -189,12 +210,10 @@ class EnergyWindowingModel:
         #     + "keV)",
         #     fontweight="bold",
         # )
-        ax.get_xaxis().set_visible(False)
-        ax.get_yaxis().set_visible(False)
         return fig
 
     def __plot_theta(self):
-        fig = plt.figure()
+        fig = self.figures.figure("theta_map")
         ax = fig.add_subplot()
         mesh = ax.pcolormesh(self.theta, cmap="jet", vmin=0)
         fig.colorbar(
@@ -204,60 +223,85 @@ class EnergyWindowingModel:
         return fig
 
     def __plot_bg_sub_spectrum(self):
-        sample = self.data_frame.at[0, "Spectra"]
-        background = self.data_frame.at[1, "Spectra"]
+        sample = self.dataset.spectra[0]
+        background = self.dataset.spectra[1]
         if len(self.windows) > 1:
             sample = np.sum(sample, axis=0)
             background = np.sum(background, axis=0)
         q_range = self.q_range[:-1]
         bg_sub_data = np.reshape(sample - background, (len(q_range)))
-        fig = plt.figure(figsize=(7, 6))
-        plt.plot(q_range, bg_sub_data)
-        plt.xlabel("${q(nm^{-1})}$", fontsize=16)
-        plt.xlim(0, 30)
-        plt.ylabel("Counts", fontsize=16)
-        plt.ylim(0, np.max(sample - background))
-        plt.yticks(fontsize=16)
-        plt.xticks(fontsize=16)
-        plt.title("Background Subtracted Spectrum", fontweight="bold")
+        fig = self.figures.figure("bg_sub_plot", figsize=(7, 6))
+        ax = fig.add_subplot()
+        ax.plot(q_range, bg_sub_data)
+        ax.set_xlabel("${q(nm^{-1})}$", fontsize=16)
+        ax.set_xlim(0, 30)
+        ax.set_ylabel("Counts", fontsize=16)
+        ax.set_ylim(0, np.max(sample - background))
+        ax.tick_params(labelsize=16)
+        ax.set_title("Background Subtracted Spectrum", fontweight="bold")
         return fig
 
     def __plot_spectra(self):
-        sample = self.data_frame.at[0, "Spectra"]
-        background = self.data_frame.at[1, "Spectra"]
+        sample = self.dataset.spectra[0]
+        background = self.dataset.spectra[1]
         if len(self.windows) > 1:
             sample = np.sum(sample, axis=0)
             background = np.sum(background, axis=0)
         q_range = self.q_range[:-1]
-        fig = plt.figure(figsize=(7, 6))
-        plt.plot(q_range, np.reshape(sample, (len(q_range))))
-        plt.plot(q_range, np.reshape(
+        fig = self.figures.figure("spectra", figsize=(7, 6))
+        ax = fig.add_subplot()
+        ax.plot(q_range, np.reshape(sample, (len(q_range))))
+        ax.plot(q_range, np.reshape(
             background, (len(q_range))), linestyle="dotted")
-        plt.xlabel("${q(nm^{-1})}$", fontsize=16)
-        plt.xlim(0, 30)
-        plt.ylabel("Counts", fontsize=16)
-        plt.yticks(fontsize=16)
-        plt.xticks(fontsize=16)
-        # plt.title("Background Subtracted Spectrum", fontweight="bold")
-        plt.legend(["Sample", "Background"], fontsize=16)
+        ax.set_xlabel("${q(nm^{-1})}$", fontsize=16)
+        ax.set_xlim(0, 30)
+        ax.set_ylabel("Counts", fontsize=16)
+        ax.tick_params(labelsize=16)
+        # ax.set_title("Background Subtracted Spectrum", fontweight="bold")
+        ax.legend(["Sample", "Background"], fontsize=16)
         return fig
 
     def __plot_3d_spectra(self):
-        spectra = self.data_frame["Spectra"]
+        spectra = self.dataset.spectra
         q_range = self.q_range[:-1]
-        fig = plt.figure(figsize=(7, 6))
+        fig = self.figures.figure("window_3d", figsize=(7, 6))
         ax = fig.add_subplot(projection="3d")
         bg_sub_data = np.subtract(spectra[0], spectra[1])
-        for x in range(len(bg_sub_data)):
-            window = self.windows[x]
-            ax.plot3D(
-                q_range,
-                [window[0]] * len(q_range),
-                bg_sub_data[x],
-                label=str(window[0]) + " keV",
-            )
+        rendering.waterfall(
+            ax, q_range, [window[0] for window in self.windows.values()], bg_sub_data)
         ax.set_ylabel("Energy(keV)")
         ax.set_xlabel("${q(nm^{-1})}$")
         ax.set_zlabel("Counts")
         ax.grid(False)
         return fig
+
+    def __plot_window_explorer(self):
+        """
+        Background corrected detector image of an energy window chosen with a
+        slider, redrawn from the cumulative sum as the slider moves.
+        """
+        fig = self.figures.figure("window_explorer", figsize=(7, 7))
+        ax = fig.add_axes([0.1, 0.2, 0.75, 0.7])
+        slider_ax = fig.add_axes([0.15, 0.06, 0.65, 0.04])
+        first, last = self.energy_range[0], self.energy_range[-1]
+        shown = rendering.show_image(
+            fig, ax, self.window_image(self.energy_range), label="Counts")
+        ax.set_aspect(1.0 / ax.get_data_ratio(), adjustable="box")
+        ax.set_title(f"{first}-{last} keV", fontweight="bold")
+        slider = RangeSlider(slider_ax, "keV", first, last, valinit=(first, last),
+                             valstep=1)
+
+        def update(value):
+            start, end = int(value[0]), int(value[1])
+            # Energies of the range, following its bin width, within the slider's limits
+            energies = self.energy_range[
+                (self.energy_range >= start) & (self.energy_range <= end)]
+            image = self.window_image(energies)
+            shown.set_data(image)
+            shown.set_clim(0, max(image.max(), 1))
+            ax.set_title(f"{start}-{end} keV", fontweight="bold")
+            fig.canvas.draw_idle()
+
+        slider.on_changed(update)
+        self.figures.keep("window_explorer", slider)
+        return fig
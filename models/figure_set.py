@@ -0,0 +1,73 @@
+"""
+Figures of an analysis that outlive the model that drew them.
+
+The models draw on matplotlib.figure.Figure objects, which are not tracked by
+pyplot and are freed with their last reference. Passing the same FigureSet to
+the plot() of every new model reuses its figures, so resubmitting an analysis
+redraws the existing figures and canvases instead of opening new ones.
+"""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+
+class FigureSet:
+    """
+    Figures by key, with the interactive widgets drawn on them.
+
+    Attributes
+    ----------
+    figures : dict
+        Figure of every key, in the order they were first drawn.
+    widgets : dict
+        Widget of every key that has one, kept alive as long as its figure.
+    """
+
+    def __init__(self):
+        self.figures = {}
+        self.widgets = {}
+
+    def figure(self, key: str, figsize: tuple = None) -> "Figure":
+        """
+        The cleared figure of key, created on the first call.
+
+        Parameters
+        ----------
+        key : str
+            Name of the figure.
+        figsize : tuple, optional
+            (width, height) in inches of a new figure. Reused figures keep
+            their size, which follows their canvas once embedded.
+
+        Returns
+        -------
+        Figure
+            An empty figure.
+        """
+        fig = self.figures.get(key)
+        if fig is None:
+            # Imported here, an empty set is created before matplotlib is loaded
+            from matplotlib.figure import Figure
+            fig = self.figures[key] = Figure(figsize=figsize)
+            return fig
+        widget = self.widgets.pop(key, None)
+        if widget is not None:
+            # Its event handlers are registered on the figure, not its axes
+            widget.disconnect_events()
+        fig.clear()
+        return fig
+
+    def keep(self, key: str, widget):
+        """Keeps the widget drawn on the figure of key until it is redrawn"""
+        self.widgets[key] = widget
+
+    def items(self):
+        return self.figures.items()
+
+    def __getitem__(self, key: str) -> "Figure":
+        return self.figures[key]
+
+    def __len__(self) -> int:
+        return len(self.figures)
@@ -0,0 +1,147 @@
+"""
+Detector geometry shared by the analyses: the scattering angle of every pixel
+and the q value of every (energy, pixel) cell.
+
+The geometry is computed with NumPy broadcasting and cached on its defining
+parameters, so repeated submits with the same set up reuse the arrays and the
+q bin lookups built from them. A lookup holds an index per detector cell, as
+large as the geometry's q_image, so the cache is bounded by its total size
+rather than by a number of entries.
+"""
+
+from collections import OrderedDict
+import threading
+import numpy as np
+from models.q_binning import QBinLookup
+
+# Pitch of the detector pixels in mm
+PIXEL_PITCH_mm = 0.25
+
+# Total size of the cached geometries and their q bin lookups
+MAX_CACHE_BYTES = 1 << 30
+
+# Geometries by their parameters, ordered from least to most recently used
+_geometries = OrderedDict()
+_lock = threading.RLock()
+
+
+class DetectorGeometry:
+    """
+    Scattering geometry of one detector set up.
+
+    Attributes
+    ----------
+    theta : np.ndarray
+        [row, col] angular distance of each pixel from the incident beam.
+    q_image : np.ndarray
+        [energy, row, col] momentum transfer of each cell.
+    """
+
+    def __init__(self, shape: tuple, samp_det_dist: float, transm_beam_x_pos: float,
+                 transm_beam_y_pos: float, pixel_pitch: float, energy_bins: tuple):
+        _, n_rows, n_cols = shape
+        x = np.arange(1, n_cols + 1)
+        y = np.arange(1, n_rows + 1)
+        d = np.sqrt(((x*pixel_pitch - pixel_pitch*transm_beam_x_pos)**2)[None, :]
+                    + ((y*pixel_pitch - pixel_pitch*transm_beam_y_pos)**2)[:, None])
+        self.theta = np.arctan(d/samp_det_dist)
+        energies = np.asarray(energy_bins, dtype=float)[:, None, None]
+        self.q_image = (4*np.pi*energies*np.sin(self.theta/2))/1.24
+        # Cached arrays are shared between callers
+        self.theta.setflags(write=False)
+        self.q_image.setflags(write=False)
+        self._lookups = {}
+
+    def q_bin_lookup(self, q_range: np.ndarray, energies: np.ndarray) -> QBinLookup:
+        """
+        Returns the (cached) QBinLookup of this geometry for the given q bin
+        edges and energy indices.
+        """
+        key = (tuple(np.asarray(q_range).tolist()),
+               tuple(np.asarray(energies).tolist()))
+        with _lock:
+            lookup = self._lookups.pop(key, None)
+            if lookup is None:
+                lookup = QBinLookup(self.q_image, q_range, energies)
+            # Reinsert so the dictionary stays ordered from least to most recently used
+            self._lookups[key] = lookup
+            _trim_cache(self)
+        return lookup
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the arrays of the geometry and of its cached lookups"""
+        return self.theta.nbytes + self.q_image.nbytes + sum(
+            lookup.bins.nbytes for lookup in self._lookups.values())
+
+    def _evict_lookups(self, max_bytes: int):
+        """Drops the least recently used lookups, but the last one, above max_bytes"""
+        while len(self._lookups) > 1 and self.nbytes > max_bytes:
+            del self._lookups[next(iter(self._lookups))]
+
+
+def _trim_cache(in_use: DetectorGeometry = None):
+    """
+    Evicts the least recently used geometries, then the least recently used
+    lookups of the one in use, until the cache fits in MAX_CACHE_BYTES.
+    """
+    geometries = list(_geometries.items())
+    # A geometry built directly counts as well, it is bounded like a cached one
+    if in_use is not None and all(geometry is not in_use for _, geometry in geometries):
+        geometries.append((None, in_use))
+    total = sum(geometry.nbytes for _, geometry in geometries)
+    for key, geometry in geometries:
+        if total <= MAX_CACHE_BYTES:
+            return
+        if geometry is not in_use:
+            total -= _geometries.pop(key).nbytes
+    # Only the geometry in use is left
+    if in_use is not None:
+        in_use._evict_lookups(MAX_CACHE_BYTES)
+
+
+def clear_cache():
+    """Drops every cached geometry and lookup"""
+    with _lock:
+        _geometries.clear()
+
+
+def detector_geometry(shape: tuple, samp_det_dist: float, transm_beam_x_pos: float,
+                      transm_beam_y_pos: float, pixel_pitch: float = PIXEL_PITCH_mm,
+                      energy_bins=None) -> DetectorGeometry:
+    """
+    Returns the geometry of a detector, computing it only the first time a
+    given set of parameters is seen.
+
+    Parameters
+    ----------
+    shape : tuple
+        [energy, row, col] shape of the detector images.
+    samp_det_dist : float
+        Distance in mm from the sample to the detector.
+    transm_beam_x_pos : float
+        Location of the incident beam in pixels.
+    transm_beam_y_pos : float
+        Location of the incident beam in pixels.
+    pixel_pitch : float
+        Pixel pitch in mm.
+    energy_bins : np.ndarray, optional
+        Energy in keV of each index of the detector images' axis 0. Defaults to
+        index + 1.
+
+    Returns
+    -------
+    DetectorGeometry
+    """
+    if energy_bins is None:
+        energy_bins = np.arange(1, shape[0] + 1)
+    key = (tuple(int(n) for n in shape), float(samp_det_dist),
+           float(transm_beam_x_pos), float(transm_beam_y_pos), float(pixel_pitch),
+           tuple(np.asarray(energy_bins, dtype=float).tolist()))
+    with _lock:
+        geometry = _geometries.pop(key, None)
+        if geometry is None:
+            geometry = DetectorGeometry(*key)
+        _geometries[key] = geometry
+        _trim_cache(geometry)
+    return geometry
@@ -0,0 +1,178 @@
+"""
+Header-only index of the .hxt files in a scan directory.
+
+The index is kept in a small sqlite file next to the data and is updated
+incrementally: only files that are new or whose size or modification time
+changed have their header reread. Detector counts are never read.
+"""
+
+import os
+import re
+import sqlite3
+import numpy as np
+from models.sSAXS_tools import hxtV3ReadHeader
+
+
+class HxtCatalog:
+    """
+    Persistent catalog of the .hxt headers found in a directory.
+
+    Usage
+    -----
+    with HxtCatalog(directory) as catalog:
+        catalog.refresh()
+        paths = catalog.paths(order_by=("mssY", "mssX"))
+    """
+
+    FILE_NAME = ".hxt_catalog.sqlite"
+    # Header fields stored as integer columns, in the order hxtV3ReadHeader names them
+    POSITION_FIELDS = ("mssX", "mssY", "mssZ", "MssRot",
+                       "GalX", "GalY", "GalZ", "GalRot", "GalRot2")
+    SHAPE_FIELDS = ("nRows", "nCols", "nBins")
+    COLUMNS = ("name", "size", "mtime_ns", "valid") + POSITION_FIELDS + (
+        "filePreFix", "timestamp") + SHAPE_FIELDS + ("bins", "payload_offset")
+
+    def __init__(self, directory: str, extension: str = ".hxt", index_path: str = None):
+        """
+        Parameters
+        ----------
+        directory : str
+            Directory containing the scan files.
+        extension : str
+            Only files ending in this extension are indexed.
+        index_path : str, optional
+            Location of the sqlite index. Defaults to FILE_NAME inside directory,
+            falling back to an in-memory index if the directory is read only.
+        """
+        self.directory = os.path.abspath(directory)
+        self.extension = extension
+        if index_path is None:
+            index_path = os.path.join(self.directory, self.FILE_NAME)
+        try:
+            self._connection = sqlite3.connect(index_path)
+            self.__create_table()
+        except sqlite3.OperationalError:
+            self._connection = sqlite3.connect(":memory:")
+            self.__create_table()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def __create_table(self):
+        integer_columns = ", ".join(
+            f"{name} INTEGER" for name in self.POSITION_FIELDS + self.SHAPE_FIELDS)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, valid INTEGER, "
+            f"{integer_columns}, filePreFix TEXT, timestamp TEXT, "
+            "bins BLOB, payload_offset INTEGER)")
+        self._connection.commit()
+
+    def refresh(self) -> int:
+        """
+        Brings the index up to date with the directory. Headers are only read
+        for files that were added or modified since the last refresh.
+
+        Returns
+        -------
+        int
+            The number of files whose header was (re)read.
+        """
+        known = {
+            name: (size, mtime_ns) for name, size, mtime_ns in
+            self._connection.execute("SELECT name, size, mtime_ns FROM files")
+        }
+        on_disk = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(self.extension) and entry.is_file():
+                    stat = entry.stat()
+                    on_disk[entry.name] = (stat.st_size, stat.st_mtime_ns)
+
+        removed = [(name,) for name in known.keys() - on_disk.keys()]
+        changed = [name for name, stat in on_disk.items()
+                   if known.get(name) != stat]
+        rows = [self.__header_row(name, *on_disk[name]) for name in changed]
+        placeholders = ", ".join("?" * len(self.COLUMNS))
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM files WHERE name = ?", removed)
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO files ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def __header_row(self, name: str, size: int, mtime_ns: int) -> tuple:
+        try:
+            header = hxtV3ReadHeader(os.path.join(self.directory, name))
+        except (OSError, ValueError):
+            header = None
+        if header is None:
+            return (name, size, mtime_ns, 0) + (None,) * (len(self.COLUMNS) - 4)
+        return (name, size, mtime_ns, 1) \
+            + tuple(header[field] for field in self.POSITION_FIELDS) \
+            + (header["filePreFix"], header["timestamp"]) \
+            + tuple(header[field] for field in self.SHAPE_FIELDS) \
+            + (header["bins"].tobytes(), header["payload_offset"])
+
+    @staticmethod
+    def natural_key(name: str) -> list:
+        """Sort key of a file name comparing its digit runs as numbers, scan_2 before scan_10"""
+        return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+    def entries(self, order_by=("name",), **bounds) -> list:
+        """
+        Returns the indexed headers of every valid file as dictionaries.
+
+        Parameters
+        ----------
+        order_by : tuple of str
+            Column names to sort by, e.g. ("mssY", "mssX"). Names are sorted
+            by the numbers they contain, see natural_key().
+        **bounds : tuple(low, high)
+            Inclusive range filters on integer columns, e.g. mssX=(0, 100).
+
+        Returns
+        -------
+        list of dict
+            One dictionary per file with the header fields, 'path', 'size' and
+            'mtime_ns'. 'bins' is returned as a np.ndarray.
+        """
+        for column in tuple(order_by) + tuple(bounds):
+            if column not in self.COLUMNS:
+                raise ValueError(f"Unknown catalog column: {column}")
+        where = ["valid = 1"]
+        params = []
+        for column, (low, high) in bounds.items():
+            where.append(f"{column} BETWEEN ? AND ?")
+            params.extend([low, high])
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM files WHERE {' AND '.join(where)}"
+        rows = [dict(zip(self.COLUMNS, row)) for row in self._connection.execute(query, params)]
+        # Sorted here rather than by sqlite, which orders names character by character
+        rows.sort(key=lambda row: tuple(
+            self.natural_key(row[column]) if column == "name" else row[column]
+            for column in order_by))
+        ret = []
+        for entry in rows:
+            entry["path"] = os.path.join(self.directory, entry.pop("name"))
+            entry["bins"] = np.frombuffer(entry["bins"], dtype='<f8')
+            del entry["valid"]
+            ret.append(entry)
+        return ret
+
+    def paths(self, order_by=("name",), **bounds) -> list:
+        """The full paths of the indexed files, see entries()."""
+        return [entry["path"] for entry in self.entries(order_by, **bounds)]
+
+    def invalid_paths(self) -> list:
+        """The full paths of the indexed files that are unreadable or not version 3 .hxt files"""
+        names = [name for name, in self._connection.execute(
+            "SELECT name FROM files WHERE valid = 0")]
+        return [os.path.join(self.directory, name)
+                for name in sorted(names, key=self.natural_key)]
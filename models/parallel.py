@@ -0,0 +1,101 @@
+"""
+Process pool execution of the spectra reduction.
+
+The q bin lookup is placed in shared memory once and attached by every worker
+when it starts, so tasks only carry a file path (or an image that is not backed
+by a file) and return the small reduced spectra.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from models.q_binning import QBinLookup
+
+# State of a worker process, set once by _init_worker
+_worker_lookup: QBinLookup = None
+_worker_memory: shared_memory.SharedMemory = None
+
+
+class SharedLookup:
+    """
+    Copy of a QBinLookup's arrays in a shared memory block. Only the small
+    description returned by spec is pickled to the workers.
+    """
+
+    def __init__(self, lookup: QBinLookup):
+        arrays = [lookup.energies, lookup.bins]
+        self._memory = shared_memory.SharedMemory(
+            create=True, size=max(sum(array.nbytes for array in arrays), 1))
+        layout = []
+        offset = 0
+        for array in arrays:
+            shared = np.ndarray(array.shape, array.dtype,
+                                buffer=self._memory.buf, offset=offset)
+            shared[...] = array
+            layout.append((offset, array.dtype.str, array.shape))
+            offset += array.nbytes
+        self.spec = (self._memory.name, layout, lookup.num_q_bins)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._memory.close()
+        self._memory.unlink()
+
+    @staticmethod
+    def attach(spec: tuple):
+        """Rebuilds the lookup described by spec, returns (lookup, memory)."""
+        name, layout, num_q_bins = spec
+        memory = shared_memory.SharedMemory(name=name)
+        energies, bins = [
+            np.ndarray(shape, dtype, buffer=memory.buf, offset=offset)
+            for offset, dtype, shape in layout
+        ]
+        return QBinLookup.from_arrays(energies, bins, num_q_bins), memory
+
+
+def _init_worker(spec: tuple):
+    global _worker_lookup, _worker_memory
+    _worker_lookup, _worker_memory = SharedLookup.attach(spec)
+
+
+def _reduce_source(source) -> np.ndarray:
+    # Imported here to avoid a circular import with sSAXS_tools
+    from models.sSAXS_tools import hxtV3Read
+    if isinstance(source, str):
+        source, _ = hxtV3Read(source)
+    return _worker_lookup.reduce(source)
+
+
+def parallel_reduce(lookup: QBinLookup, sources: list, workers: int):
+    """
+    Reduces every source with a pool of worker processes.
+
+    Parameters
+    ----------
+    lookup : QBinLookup
+        Lookup used to reduce every image, shared with the workers.
+    sources : list of str | np.ndarray
+        Paths of .hxt files, read by the workers themselves, or in memory
+        detector images, which are pickled to the workers.
+    workers : int
+        Number of worker processes.
+
+    Yields
+    ------
+    np.ndarray
+        [n_energies, n_q_bins] spectra in the order of sources.
+    """
+    chunksize = max(1, len(sources) // (workers * 4))
+    with SharedLookup(lookup) as shared:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(shared.spec,))
+        try:
+            yield from executor.map(_reduce_source, sources, chunksize=chunksize)
+        finally:
+            # Drop the queued files if the caller stopped consuming early
+            executor.shutdown(wait=True, cancel_futures=True)
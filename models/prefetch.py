@@ -0,0 +1,192 @@
+"""
+Prefetching reader of .hxt files.
+
+The serial reduction pages a file's counts in only when binning touches them,
+so reading and binning take turns. A PrefetchReader reads the next files on
+background threads into a pool of reusable buffers while the current one is
+being reduced, which brings the wall time close to the larger of the read and
+reduction times rather than their sum, e.g. on network mounted storage.
+
+The pool bounds the memory: depth + 1 buffers of one file each, the one in
+use and the ones read ahead, whatever the scan size. A reader waits for a free
+buffer before starting the next file, so when the reduction is the bottleneck
+the readers stall on the pool (backpressure), and when reading is the
+bottleneck the reduction waits for the files.
+"""
+
+import threading
+import time
+import numpy as np
+
+
+class PrefetchReader:
+    """
+    Reads .hxt files on reader threads, yielded in order by iterating over it.
+
+    Each yielded image lives in a pooled buffer that is reused once the next
+    image is requested, so it must be reduced or copied before then. Closing
+    the reader, or leaving its with block, stops the threads.
+
+    Parameters
+    ----------
+    file_paths : list of str
+        Paths of the .hxt files, in the order they are yielded.
+    depth : int, optional
+        Files read ahead of the one being used, each in its own buffer. The
+        default is 2.
+    readers : int, optional
+        Reader threads, at most depth. Defaults to depth.
+    """
+
+    def __init__(self, file_paths: list, depth: int = 2, readers: int = None):
+        self.file_paths = list(file_paths)
+        self.depth = max(int(depth), 1)
+        readers = self.depth if readers is None else max(min(int(readers), self.depth), 1)
+        self._condition = threading.Condition()
+        self._free_buffers = [None] * (self.depth + 1)
+        # index: (buffer, image) or the error of every file read ahead
+        self._ready = {}
+        self._next_index = 0
+        self._taken = 0
+        self._closed = False
+        self._stats = {
+            "files": 0,
+            "bytes": 0,
+            "read_seconds": 0.0,
+            "consumer_wait_seconds": 0.0,
+            "backpressure_seconds": 0.0,
+            "queue_depth_max": 0,
+            "queue_depth_sum": 0,
+        }
+        self._threads = [
+            threading.Thread(target=self.__read_files, name=f"hxt-prefetch-{i}", daemon=True)
+            for i in range(min(readers, len(self.file_paths)))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        """Yields the [energy, col, row] image of every file, like hxtV3Read()"""
+        for index in range(len(self.file_paths)):
+            buffer, image = self.get(index)
+            try:
+                yield image
+            finally:
+                self.release(buffer)
+
+    def get(self, index: int):
+        """
+        The (buffer, image) of the index-th file, waiting until it is read.
+        Files must be requested in order, each once, and their buffer handed
+        back to release() before the reader can use it for a later file.
+        """
+        with self._condition:
+            start = time.perf_counter()
+            while index not in self._ready:
+                self._condition.wait()
+            self._stats["consumer_wait_seconds"] += time.perf_counter() - start
+            # Files read ahead and waiting, the one taken included
+            depth = len(self._ready)
+            self._stats["queue_depth_max"] = max(self._stats["queue_depth_max"], depth)
+            self._stats["queue_depth_sum"] += depth
+            self._taken += 1
+            result = self._ready.pop(index)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def release(self, buffer: np.ndarray):
+        """Returns the buffer of a file got with get() to the pool"""
+        with self._condition:
+            self._free_buffers.append(buffer)
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        """
+        Metrics of the files read so far.
+
+        Returns
+        -------
+        dict
+            files and bytes read, read_seconds summed over the reader threads;
+            consumer_wait_seconds, time spent waiting for a file, high when
+            reading is the bottleneck; backpressure_seconds, time the readers
+            waited for a free buffer, high when the reduction is the
+            bottleneck; queue_depth_max and queue_depth_mean, files read ahead
+            and waiting when one was taken; depth and readers.
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            taken = self._taken
+        stats["queue_depth_mean"] = stats.pop("queue_depth_sum") / max(taken, 1)
+        stats["depth"] = self.depth
+        stats["readers"] = len(self._threads)
+        return stats
+
+    def close(self):
+        """Stops the reader threads, the files not read yet are skipped"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def __read_files(self):
+        while True:
+            with self._condition:
+                if self._closed or self._next_index >= len(self.file_paths):
+                    return
+                start = time.perf_counter()
+                while not self._free_buffers and not self._closed:
+                    self._condition.wait()
+                self._stats["backpressure_seconds"] += time.perf_counter() - start
+                if self._closed or self._next_index >= len(self.file_paths):
+                    return
+                # The buffer is taken before the index, so the earliest file
+                # not read yet always has one and the consumer cannot starve
+                buffer = self._free_buffers.pop()
+                index = self._next_index
+                self._next_index += 1
+            try:
+                start = time.perf_counter()
+                buffer, image, size = self.__read(self.file_paths[index], buffer)
+                seconds = time.perf_counter() - start
+                result = (buffer, image)
+            except Exception as error:
+                result, size, seconds = error, 0, 0.0
+            with self._condition:
+                if isinstance(result, BaseException):
+                    # The consumer gets the error instead of the buffer
+                    self._free_buffers.append(buffer)
+                self._stats["files"] += 1
+                self._stats["bytes"] += size
+                self._stats["read_seconds"] += seconds
+                self._ready[index] = result
+                self._condition.notify_all()
+
+    @staticmethod
+    def __read(file_path: str, buffer: np.ndarray):
+        """Reads the counts of a file into buffer, reallocated if too small"""
+        # Imported here to avoid a circular import with sSAXS_tools
+        from models.sSAXS_tools import hxtV3ReadHeader
+        header = hxtV3ReadHeader(file_path)
+        if header is None:
+            raise ValueError(f"Not Version 3 of HXT File: {file_path}")
+        shape = (header["nRows"], header["nCols"], header["nBins"])
+        count = int(np.prod(shape))
+        if buffer is None or buffer.size < count:
+            buffer = np.empty(count, dtype='<f8')
+        counts = buffer[:count]
+        with open(file_path, 'rb') as fid:
+            fid.seek(header["payload_offset"])
+            size = fid.readinto(memoryview(counts).cast('B'))
+        if size < counts.nbytes:
+            raise ValueError(f"Truncated .hxt file: {file_path}")
+        # The same [energy, col, row] view of the counts as hxtV3Read()
+        return buffer, np.swapaxes(counts.reshape(shape), 0, 2), size
@@ -0,0 +1,128 @@
+"""
+Lookup table that assigns every (energy, pixel) cell of a detector image to a
+momentum transfer bin, so an image can be reduced to its spectra with a single
+np.bincount instead of building a mask per energy window and q bin.
+"""
+
+import numpy as np
+from models.sparse_frames import SparseFrame
+
+
+class QBinLookup:
+    """
+    Precomputed q bin index of every detector cell used by extract_spectra.
+
+    reduce() produces an energy resolved spectrum: row i holds the photon counts
+    of energy index energies[i] in every q bin, i.e. the sum of the pixels of
+    image[energies[i], ::-1, :] that fall in [q_range[k], q_range[k+1]). The
+    spectra of any set of energy windows are then row sums of that matrix, see
+    window_spectra().
+    """
+
+    def __init__(self, q_image: np.ndarray, q_range: np.ndarray, energies: np.ndarray):
+        """
+        Parameters
+        ----------
+        q_image : np.ndarray
+            q value of every [energy, row, col] cell, in the orientation of the
+            processed (row flipped) detector image.
+        q_range : np.ndarray
+            Increasing q bin edges.
+        energies : np.ndarray
+            Energy indices to resolve, one row of the reduced matrix each.
+        """
+        self.num_q_bins = len(q_range) - 1
+        self.energies = np.asarray(energies, dtype=np.intp)
+
+        q_bin = np.searchsorted(q_range, q_image[self.energies], side="right") - 1
+        in_range = (q_bin >= 0) & (q_bin < self.num_q_bins)
+        bins = np.arange(len(self.energies))[:, None, None] * self.num_q_bins + q_bin
+        # Cells outside the q range are collected in one extra bin that is dropped
+        self.size = len(self.energies) * self.num_q_bins
+        bins[~in_range] = self.size
+        # .hxt files are read in upside down, so flip the table rather than every image
+        self.bins = np.ascontiguousarray(bins[:, ::-1, :]).ravel()
+        self.energy_rows = _energy_rows(self.energies)
+
+    @classmethod
+    def from_arrays(cls, energies: np.ndarray, bins: np.ndarray, num_q_bins: int) -> "QBinLookup":
+        """
+        Rebuilds a lookup from the arrays of an existing one without copying
+        them, e.g. from shared memory in a worker process.
+        """
+        lookup = cls.__new__(cls)
+        lookup.num_q_bins = num_q_bins
+        lookup.energies = energies
+        lookup.size = len(energies) * num_q_bins
+        lookup.bins = bins
+        lookup.energy_rows = _energy_rows(energies)
+        return lookup
+
+    def reduce(self, image) -> np.ndarray:
+        """
+        Reduces one raw detector image to its energy resolved q spectrum.
+
+        Parameters
+        ----------
+        image : np.ndarray | SparseFrame
+            Raw [energy, row, col] detector image as returned by hxtV3Read, or
+            its nonzero cells.
+
+        Returns
+        -------
+        np.ndarray
+            [n_energies, n_q_bins] photon counts.
+        """
+        if isinstance(image, SparseFrame):
+            return self.__reduce_sparse(image)
+        counts = np.bincount(
+            self.bins, weights=image[self.energies].ravel(), minlength=self.size + 1)
+        return counts[:self.size].reshape(len(self.energies), self.num_q_bins)
+
+    def __reduce_sparse(self, frame: SparseFrame) -> np.ndarray:
+        # Only the nonzero cells are looked up in the table, in the same order
+        # as the dense reduction, so the sums are identical
+        energy, pixel = np.divmod(frame.indices.astype(np.intp), frame.pixels)
+        rows = self.energy_rows[np.minimum(energy, len(self.energy_rows) - 1)]
+        keep = (rows >= 0) & (energy < len(self.energy_rows))
+        cells = rows[keep] * frame.pixels + pixel[keep]
+        counts = np.bincount(
+            self.bins[cells], weights=frame.counts[keep], minlength=self.size + 1)
+        return counts[:self.size].reshape(len(self.energies), self.num_q_bins)
+
+
+def _energy_rows(energies: np.ndarray) -> np.ndarray:
+    """Row of every energy index in the reduced matrix, -1 if it is not resolved"""
+    energy_rows = np.full(int(np.max(energies, initial=-1)) + 1, -1, dtype=np.intp)
+    energy_rows[energies] = np.arange(len(energies))
+    return energy_rows
+
+
+def window_spectra(energy_spectra: np.ndarray, energies: np.ndarray,
+                   energy_windows: list) -> np.ndarray:
+    """
+    Sums the rows of an energy resolved spectrum into energy windows.
+
+    Parameters
+    ----------
+    energy_spectra : np.ndarray
+        [..., n_energies, n_q_bins] spectra as returned by QBinLookup.reduce().
+    energies : np.ndarray
+        Increasing energy index of each row of energy_spectra.
+    energy_windows : list of np.ndarray
+        Energy indices belonging to each window, all of which must be in energies.
+
+    Returns
+    -------
+    np.ndarray
+        [..., n_windows, n_q_bins] spectra.
+    """
+    energies = np.asarray(energies)
+    if len(energy_windows) == 0:
+        return np.zeros(energy_spectra.shape[:-2] + (0, energy_spectra.shape[-1]))
+    window_energies = np.concatenate(energy_windows)
+    rows = np.searchsorted(energies, window_energies)
+    if np.any(rows >= len(energies)) or np.any(energies[np.minimum(rows, len(energies) - 1)] != window_energies):
+        raise ValueError("Energy windows are outside of the resolved energies")
+    starts = np.cumsum([0] + [len(window) for window in energy_windows[:-1]])
+    return np.add.reduceat(np.take(energy_spectra, rows, axis=-2), starts, axis=-2)
@@ -0,0 +1,194 @@
+"""
+Rendering of many spectra or detector images with few artists.
+
+Drawing every spectrum with its own plot3D() call creates one artist per line,
+which makes drawing and rotating the axes slow for large scans. waterfall()
+draws all of them as a single Line3DCollection and decimates them above a
+line count, so the cost of a redraw stays bounded whatever the scan size.
+
+Likewise show_mosaic() tiles many detector images into one array drawn by a
+single imshow(), instead of one axes, mesh and colorbar per image.
+"""
+
+import math
+from typing import List, Tuple
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.image import AxesImage
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
+
+# Spectra drawn at most by default, evenly picked from larger sets
+MAX_LINES = 500
+
+
+def decimate(count: int, max_lines: int) -> np.ndarray:
+    """
+    Indices of at most max_lines evenly spaced lines out of count, keeping the
+    first and last ones. Every line is kept if max_lines is None or not less
+    than count.
+    """
+    if max_lines is None or count <= max_lines:
+        return np.arange(count)
+    if max_lines < 2:
+        return np.arange(min(count, max(max_lines, 0)))
+    return np.unique(np.linspace(0, count - 1, max_lines).round().astype(np.intp))
+
+
+def waterfall(ax, x: np.ndarray, y: np.ndarray, z: np.ndarray,
+              max_lines: int = MAX_LINES) -> Line3DCollection:
+    """
+    Draws the rows of z as lines along x, each at its own y.
+
+    Parameters
+    ----------
+    ax : Axes3D
+        3D axes to draw on, e.g. fig.add_subplot(projection="3d").
+    x : np.ndarray
+        [n_points] abscissa shared by every line, e.g. the q bins.
+    y : np.ndarray
+        [n_lines] depth of every line, e.g. the scan number or the energy.
+    z : np.ndarray
+        [n_lines, n_points] values of every line.
+    max_lines : int, optional
+        Lines drawn at most, evenly picked if there are more. None draws them
+        all. The default is MAX_LINES.
+
+    Returns
+    -------
+    Line3DCollection
+        The lines, coloured following the axes' colour cycle like separate
+        plot3D() calls.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    z = np.asarray(z, dtype=np.float64).reshape(len(y), len(x))
+    rows = decimate(len(y), max_lines)
+    segments = np.empty((len(rows), len(x), 3))
+    segments[:, :, 0] = x
+    segments[:, :, 1] = y[rows, None]
+    segments[:, :, 2] = z[rows]
+    cycle = rcParams["axes.prop_cycle"].by_key().get("color", ["C0"])
+    lines = Line3DCollection(
+        segments, colors=[cycle[row % len(cycle)] for row in rows])
+    ax.add_collection(lines)
+    if len(rows):
+        ax.auto_scale_xyz(segments[:, :, 0], segments[:, :, 1], segments[:, :, 2],
+                          had_data=False)
+    return lines
+
+
+def show_image(fig, ax, image: np.ndarray, label: str = None, **kwargs) -> AxesImage:
+    """
+    Draws a detector image with its first row at the top, like
+    pcolormesh(np.flipud(image)), with the axes hidden.
+
+    Parameters
+    ----------
+    fig : Figure
+        Figure of ax, holding the colorbar.
+    ax : Axes
+        Axes to draw on.
+    image : np.ndarray
+        [col, row] image, e.g. from EnergyWindowingModel.window_image().
+    label : str, optional
+        Label of a colorbar next to ax, no colorbar if None.
+    **kwargs
+        Passed to imshow(), overriding the jet colormap, vmin of 0, nearest
+        interpolation and auto aspect.
+
+    Returns
+    -------
+    AxesImage
+        The image, whose set_data() redraws a new image of the same shape.
+    """
+    shown = ax.imshow(image, **dict(
+        dict(cmap="jet", vmin=0, interpolation="nearest", aspect="auto"), **kwargs))
+    if label is not None:
+        fig.colorbar(shown, ax=ax, label=label)
+    ax.get_xaxis().set_visible(False)
+    ax.get_yaxis().set_visible(False)
+    return shown
+
+
+def grid_shape(count: int) -> Tuple[int, int]:
+    """(rows, columns) of the smallest near square grid of count tiles"""
+    columns = max(math.ceil(math.sqrt(count)), 1)
+    return max(math.ceil(count / columns), 1), columns
+
+
+def mosaic(images: np.ndarray, gap: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Tiles images of the same shape row by row into one array.
+
+    Parameters
+    ----------
+    images : np.ndarray
+        [n_images, height, width] images.
+    gap : int, optional
+        NaN cells between neighbouring tiles. The default is 1.
+
+    Returns
+    -------
+    tiled : np.ndarray
+        float64 [rows * (height + gap) - gap, columns * (width + gap) - gap]
+        mosaic in a grid_shape() grid, NaN outside of the tiles.
+    origins : np.ndarray
+        [n_images, 2] (row, column) in tiled of every image's first cell.
+    """
+    images = np.asarray(images, dtype=np.float64)
+    count, height, width = images.shape
+    rows, columns = grid_shape(count)
+    tiles = np.full((rows * columns, height + gap, width + gap), np.nan)
+    tiles[:count, :height, :width] = images
+    tiled = tiles.reshape(rows, columns, height + gap, width + gap).transpose(
+        0, 2, 1, 3).reshape(rows * (height + gap), columns * (width + gap))
+    index = np.arange(count)
+    origins = np.stack([index // columns * (height + gap),
+                        index % columns * (width + gap)], axis=1)
+    return tiled[:rows * (height + gap) - gap, :columns * (width + gap) - gap], origins
+
+
+def show_mosaic(fig, ax, images: np.ndarray, titles: List[str],
+                shared_colorbar: bool = True, label: str = "Counts") -> AxesImage:
+    """
+    Draws detector images as one mosaic with a single imshow(), see mosaic().
+
+    Parameters
+    ----------
+    fig : Figure
+        Figure of ax, holding the colorbar.
+    ax : Axes
+        Axes to draw on.
+    images : np.ndarray
+        [n_images, col, row] images in the orientation of show_image().
+    titles : list of str
+        Title of every image, written at the top of its tile.
+    shared_colorbar : bool, optional
+        Draws every image on one count scale with one colorbar. Otherwise each
+        image is scaled to its own maximum, which is added to its title, like
+        separate colorbars would. The default is True.
+    label : str, optional
+        Label of the shared colorbar. The default is "Counts".
+
+    Returns
+    -------
+    AxesImage
+        The mosaic.
+    """
+    images = np.asarray(images, dtype=np.float64)
+    titles = list(titles)
+    if not shared_colorbar:
+        maxima = images.reshape(len(images), -1).max(axis=1, initial=0)
+        images = images / np.where(maxima > 0, maxima, 1)[:, None, None]
+        titles = [f"{title} (max {maximum:g})" for title, maximum in zip(titles, maxima)]
+        label = f"{label} / image maximum"
+    tiled, origins = mosaic(images)
+    vmax = 1 if not shared_colorbar or not len(images) else max(np.nanmax(tiled), 1)
+    shown = show_image(fig, ax, tiled, label=label, aspect="equal", vmax=vmax)
+    # Smaller titles as the tiles get smaller
+    fontsize = max(4, 10 - 0.8 * grid_shape(len(images))[1])
+    for (row, column), title in zip(origins, titles):
+        ax.text(column, row, title, color="white", fontsize=fontsize,
+                fontweight="bold", ha="left", va="top",
+                bbox=dict(facecolor="black", alpha=0.5, linewidth=0, pad=1))
+    return shown
@@ -0,0 +1,81 @@
+"""
+Out-of-core storage of the full result of a scan.
+
+The windowed spectra of every scan are written, as they are produced, into a
+memory mapped [row, column, energy window, q] .npy file laid out like the scan
+map. Later integrations, window selections and exports slice that file instead
+of rereading the .hxt files. The axes of the cube are kept next to it in a
+small .npz file.
+"""
+
+import os
+import numpy as np
+
+
+class ResultCube:
+    """
+    Writer of a memory mapped [row, column, window, q] result cube.
+
+    Usage
+    -----
+    with ResultCube(path, (rows, columns), (windows, q), scan_rows, scan_columns) as cube:
+        stream_spectra(files, on_spectra=cube.write, ...)
+    cube = ResultCube.open(path)
+    """
+
+    def __init__(self, path: str, map_shape: tuple, spectra_shape: tuple,
+                 rows: np.ndarray, columns: np.ndarray, **axes):
+        """
+        Parameters
+        ----------
+        path : str
+            Location of the .npy file, overwritten if it exists.
+        map_shape : tuple
+            (rows, columns) of the scan map.
+        spectra_shape : tuple
+            (energy windows, q bins) of the spectra of a scan.
+        rows, columns : np.ndarray
+            Map cell of every scan, in the order the spectra are written.
+            Cells without a scan stay NaN.
+        **axes : np.ndarray
+            Coordinates saved with the cube, e.g. q_range or map_x, see axes().
+        """
+        self.path = path
+        self.rows = np.asarray(rows)
+        self.columns = np.asarray(columns)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.cube = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.float64,
+            shape=tuple(map_shape) + tuple(spectra_shape))
+        self.cube[...] = np.nan
+        np.savez(self.axes_path(path), **axes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def axes_path(path: str) -> str:
+        return os.path.splitext(path)[0] + "_axes.npz"
+
+    def write(self, index: int, spectra: np.ndarray):
+        """Stores the [window, q] spectra of the index-th scan, extra scans are ignored"""
+        if index < len(self.rows):
+            self.cube[self.rows[index], self.columns[index]] = spectra
+
+    def close(self):
+        self.cube.flush()
+        self.cube = None
+
+    @staticmethod
+    def open(path: str) -> np.ndarray:
+        """Opens a written cube read-only, without loading it into memory"""
+        return np.load(path, mmap_mode="r")
+
+    @staticmethod
+    def axes(path: str) -> dict:
+        """The coordinates saved with the cube at path"""
+        with np.load(ResultCube.axes_path(path)) as axes:
+            return dict(axes)
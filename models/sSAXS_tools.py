@@ -2,11 +2,21 @@
 @authors: Sabri.Amer, Andrew.Xu
 """
 
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-import math
 import glob
+import struct
+from contextlib import closing
+from models.counts import COUNT_DTYPES, compact_dtype
+from models.geometry import detector_geometry, PIXEL_PITCH_mm
+from models import scan_map
+from models.parallel import parallel_reduce
+from models.prefetch import PrefetchReader
+from models.q_binning import window_spectra
+from models.scan_dataset import ScanDataset
+from models.sparse_frames import SparseFrame, SparseFrames
+from models.spectra_cache import SpectraCache
+from models.telemetry import NO_TELEMETRY
 
 
 def fread(filenergy_rangeD: str, sizeA: int, precision: str):
@@ -44,11 +54,71 @@ def fread(filenergy_rangeD: str, sizeA: int, precision: str):
         return np.fromfile(filenergy_rangeD, np.int8, count=sizeA)
 
 
+# Fixed-size preamble of a version 3 .hxt file:
+# label, version, mssX/Y/Z, MssRot, GalX/Y/Z, GalRot, GalRot2, nCharFPreFix,
+# file prefix (padded to 100 characters), timestamp, nRows, nCols, nBins.
+# The energy bins (nBins doubles) and the detector counts follow directly after.
+HXT_V3_PREAMBLE = struct.Struct('<8sQ9Ii100s16s3I')
+
+
+def hxtV3ReadHeader(filePath: str):
+    """
+    Parses only the header of a version 3 .hxt file. The detector counts are
+    not read.
+
+    Parameters
+    ----------
+    filePath : str
+
+    Returns
+    -------
+    dict | None
+        The header fields (mssX, mssY, mssZ, MssRot, GalX, GalY, GalZ, GalRot,
+        GalRot2, filePreFix, timestamp, nRows, nCols, nBins), the energy bins
+        and the byte offset of the detector counts. None if the file is not a
+        version 3 .hxt file.
+
+    """
+    with open(filePath, 'rb') as fid:
+        preamble = fid.read(HXT_V3_PREAMBLE.size)
+        if preamble[:8].decode('latin-1').lower() != 'hexitech':
+            return None
+        if len(preamble) < HXT_V3_PREAMBLE.size:
+            raise ValueError(f"Truncated .hxt header: {filePath}")
+        (_, version, mssX, mssY, mssZ, MssRot, GalX, GalY, GalZ, GalRot,
+         GalRot2, nCharFPreFix, filePreFix, timestamp,
+         nRows, nCols, nBins) = HXT_V3_PREAMBLE.unpack(preamble)
+        if version != 3:
+            return None
+        bins = np.frombuffer(fid.read(8 * nBins), dtype='<f8')
+    return {
+        "mssX": mssX,
+        "mssY": mssY,
+        "mssZ": mssZ,
+        "MssRot": MssRot,
+        "GalX": GalX,
+        "GalY": GalY,
+        "GalZ": GalZ,
+        "GalRot": GalRot,
+        "GalRot2": GalRot2,
+        "filePreFix": filePreFix[:max(nCharFPreFix, 0)].decode('latin-1'),
+        "timestamp": timestamp.rstrip(b'\x00').decode('latin-1'),
+        "nRows": nRows,
+        "nCols": nCols,
+        "nBins": nBins,
+        "bins": bins,
+        "payload_offset": HXT_V3_PREAMBLE.size + 8 * nBins,
+    }
+
+
 def hxtV3Read(filePath: str):
     """
      Method to parse the header of the .hxt file format, you will need to write
      your own version for any other file type you wish to use.
 
+     The detector counts are memory mapped rather than read, so no payload is
+     copied into memory until it is actually used.
+
      Parameters
      ----------
      filePath : str
@@ -57,57 +127,37 @@ def hxtV3Read(filePath: str):
      -------
      list [M,bins]
          Returns a list of the file's detector images and the energy bins represented
-         in M's axis0.
+         in M's axis0. M is a read-only view of a np.memmap.
 
      """
-    #
-    fid = open(filePath, 'rb')
-    # read first 8 characters to distinguish file type
-    label = "%s" % fread(fid, 8, 'char')
-    M = 0
-    bins = 0
-    if label.lower() == 'hexitech':
-        version = fread(fid, 1, 'uint64')
-        if version == 3:
-            mssX = fread(fid, 1, 'uint32')
-            mssY = fread(fid, 1, 'uint32')
-            mssZ = fread(fid, 1, 'uint32')
-            MssRot = fread(fid, 1, 'uint32')
-            GalX = fread(fid, 1, 'uint32')
-            GalY = fread(fid, 1, 'uint32')
-            GalZ = fread(fid, 1, 'uint32')
-            GalRot = fread(fid, 1, 'uint32')
-            GalRot2 = fread(fid, 1, 'uint32')
-            nCharFPreFix = fread(fid, 1, 'int32')
-            filePreFix = fread(fid, nCharFPreFix[0], 'char')
-
-            # The next two lines are used to skip some unnecessary parts of the binary file
-            dummy = fread(fid, 100 - nCharFPreFix[0], 'dummy')
-            timestamp = fread(fid, 16, 'timestamp')
-
-            nRows = fread(fid, 1, 'uint32')
-            nCols = fread(fid, 1, 'uint32')
-            nBins = fread(fid, 1, 'uint32')
-            bins = fread(fid, nBins[0], 'double')
-            d = fread(fid, nBins[0] * nRows[0] * nCols[0], 'double')
-            M = np.reshape(d, [nRows[0], nCols[0], nBins[0]])
-            M = np.swapaxes(M, 0, 2)
-        else:
-            print("Not Version 3 of HXT File - Zeros Returned")
-    fid.close()
-    return [M, bins]
-
-
-def extract_spectra(data_frame: pd.DataFrame, **kwargs):
+    header = hxtV3ReadHeader(filePath)
+    if header is None:
+        print("Not Version 3 of HXT File - Zeros Returned")
+        return [0, 0]
+    M = np.memmap(filePath, dtype='<f8', mode='r',
+                  offset=header["payload_offset"],
+                  shape=(header["nRows"], header["nCols"], header["nBins"]))
+    M = np.swapaxes(M, 0, 2)
+    return [M, header["bins"]]
+
+
+def extract_spectra(data_frame, **kwargs):
     """
     Calculates the momentum transfer spectra from the raw detector images.
-    Spectra are appended to the data frame at the same row of their corresponding
-    detector data.
+    Spectra are stored at the same index as their corresponding detector data:
+    the spectra of the energy windows in dataset.spectra, [file, window, q],
+    and the counts at the detector's energy resolution in
+    dataset.energy_spectra, [file, energy, q], from which rewindow_spectra()
+    derives other windows without rereading the images.
+
+    A pd.DataFrame with an 'Image' column is also accepted, in which case the
+    spectra are appended as its 'Spectra' and 'Energy_Spectra' columns and the
+    energies of the latter are kept in data_frame.attrs['energies'].
 
     Parameters
     ----------
-    data_frame : pd.DataFrame
-        Data frame of the extraced detector data from bundle_data().
+    data_frame : ScanDataset | pd.DataFrame
+        The extraced detector data from bundle_data().
     **kwargs : np.ndarray, int
         Experimental and analysis parameters for calculation.
 
@@ -124,6 +174,32 @@ def extract_spectra(data_frame: pd.DataFrame, **kwargs):
         energy_window_width: int
             The width in keV of the subranges the user would like to divide thier
             energy range into.
+        energies: np.ndarray(numerical)
+            Energy indices resolved in 'Energy_Spectra'. Defaults to every index
+            from the lowest to the highest value of energy_range.
+        pixel_pitch: float
+            Pitch of the detector pixels in mm.
+        workers: int
+            Number of worker processes used to reduce the files. Files with a
+            known path are read by the workers themselves.
+        progress: Callable[[int, int], None]
+            Called with (files completed, total files) after each file. It may
+            raise to abort the analysis. Prints the progress by default.
+        cache: SpectraCache
+            Cache of previously reduced files. Files with a known path that
+            are found in it are neither read nor binned.
+        on_spectra: Callable[[int, np.ndarray], None]
+            Called with (index, [window, q] spectra) of every file as soon as
+            it is reduced, e.g. ResultCube.write.
+        prefetch: int
+            Files read ahead on reader threads while the current one is
+            reduced, see PrefetchReader. Applies to files reduced in this
+            process, workers read their own. 0, the default, reads each file
+            when it is reduced.
+        telemetry: Telemetry
+            Collects the geometry, reduction, per-file read, binning and
+            windowing spans, and the "prefetch" metrics of the reader.
+            Disabled by default.
 
     Returns
     -------
@@ -133,94 +209,373 @@ def extract_spectra(data_frame: pd.DataFrame, **kwargs):
         Each pixel's angular distance from the incident beam
 
     """
-    # Default Values For Testing With Included Caffiene Data
-    samp_det_dist = kwargs.get(
-        'samp_det_dist') if 'samp_det_dist' in kwargs else 244
-    transm_beam_x_pos = kwargs.get(
-        'transm_beam_x_pos') if 'transm_beam_x_pos' in kwargs else 9
-    transm_beam_y_pos = kwargs.get(
-        'transm_beam_y_pos') if 'transm_beam_y_pos' in kwargs else 1
-    energy_range = kwargs.get(
-        'energy_range') if 'energy_range' in kwargs else np.arange(30, 80)
-    q_range = kwargs.get('q_range') if 'q_range' in kwargs else np.linspace(
-        0.04, 30.04, num=63)
-    energy_window_width = kwargs.get(
-        'energy_window_width') if 'energy_window_width' in kwargs else len(energy_range)
-    num_q_bins = len(q_range)-1
+    if isinstance(data_frame, ScanDataset):
+        return _extract_dataset_spectra(data_frame, **kwargs)
     # Determine detector shape
     data_dimensions = np.shape(data_frame.loc[0, 'Image'])
-    theta = np.zeros([data_dimensions[1], data_dimensions[2]])
-    q_image = np.zeros(
-        [data_dimensions[0], data_dimensions[1], data_dimensions[2]])
+    reduction = _Reduction(data_dimensions, **kwargs)
+    data_frame['Energy_Spectra'] = None
+    data_frame['Spectra'] = None
+    data_frame.attrs['energies'] = reduction.energies
+
+    if 'File' in data_frame and (reduction.workers > 1 or reduction.cache is not None):
+        # Files with a known path can be read by workers or served from the cache
+        sources = [file if isinstance(file, str) else image for file, image
+                   in zip(data_frame['File'], data_frame['Image'])]
+    else:
+        sources = list(data_frame['Image'])
+    # Closing the reduction stops any worker processes if progress raises
+    with reduction.telemetry.span("reduction"), \
+            closing(reduction.reduce(sources)) as all_q_counts:
+        for i, energy_q_counts in enumerate(all_q_counts):
+            data_frame.at[i, 'Energy_Spectra'] = energy_q_counts
+            data_frame.at[i, 'Spectra'] = reduction.store(i, energy_q_counts)
+            reduction.progress(i+1, len(data_frame))
+    # Return values for plotting, spectral data is appended to the data frame
+    return reduction.windows, reduction.theta
+
+
+def _extract_dataset_spectra(dataset: ScanDataset, **kwargs):
+    """extract_spectra() of a ScanDataset, the spectra fill its preallocated arrays"""
+    reduction = _Reduction(dataset.images.shape[1:], **kwargs)
+    dataset.allocate_spectra(reduction.energies, len(reduction.energy_windows),
+                             reduction.lookup.num_q_bins)
+    if reduction.workers > 1 or reduction.cache is not None:
+        # Files can be read by workers or served from the cache
+        sources = list(dataset.files)
+    else:
+        sources = list(dataset.images)
+    with reduction.telemetry.span("reduction"), \
+            closing(reduction.reduce(sources)) as all_q_counts:
+        for i, energy_q_counts in enumerate(all_q_counts):
+            dataset.energy_spectra[i] = energy_q_counts
+            dataset.spectra[i] = reduction.store(i, energy_q_counts)
+            reduction.progress(i+1, len(dataset))
+    return reduction.windows, reduction.theta
+
+
+def stream_spectra(file_paths: list, **kwargs):
+    """
+    Streaming counterpart of bundle_data() followed by extract_spectra(). Each
+    file is read, reduced to its spectra and released before the next one, so
+    memory is bounded by the spectra plus the images in flight rather than
+    by the size of the scan.
+
+    Parameters
+    ----------
+    file_paths : list of str
+        Paths of the .hxt files to reduce, in order.
+    **kwargs : np.ndarray, int
+        Experimental and analysis parameters, see extract_spectra().
+
+        headers: list of dict
+            Already read header of every file, e.g. from HxtCatalog.entries(),
+            so they are not read again. Read from the files by default.
+        keep_energy_spectra: bool
+            Whether dataset.energy_spectra, [file, energy, q], is kept for
+            rewindow_spectra(). It is as many times larger than the windowed
+            spectra as there are energies per window, so it is not kept by
+            default.
 
+    Returns
+    -------
+    dataset : ScanDataset
+        Metadata, energy bins and spectra of every file, in order. Images are
+        not kept, nor the energy resolved spectra unless keep_energy_spectra.
+    windows : np.ndarray(numerical)
+        List containing all of the energy windows and their values for later plotting.
+    theta : np.ndarray
+        Each pixel's angular distance from the incident beam
+
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        raise ValueError("No files to reduce")
+    headers = kwargs.get('headers') if 'headers' in kwargs else [
+        hxtV3ReadHeader(file) for file in file_paths]
+    for file, header in zip(file_paths, headers):
+        if header is None:
+            raise ValueError(f"Not Version 3 of HXT File: {file}")
+    header = headers[0]
+    # Shape of the [energy, ...] view returned by hxtV3Read
+    data_dimensions = (header["nBins"], header["nCols"], header["nRows"])
+    reduction = _Reduction(data_dimensions, **kwargs)
+    dataset = ScanDataset(ScanDataset.metadata_from_headers(file_paths, headers),
+                          bins=np.stack([header["bins"] for header in headers]))
+    keep_energy_spectra = bool(kwargs.get('keep_energy_spectra'))
+    dataset.allocate_spectra(reduction.energies, len(reduction.energy_windows),
+                             reduction.lookup.num_q_bins, keep_energy_spectra)
+    with reduction.telemetry.span("reduction"), \
+            closing(reduction.reduce(file_paths)) as all_q_counts:
+        for i, energy_q_counts in enumerate(all_q_counts):
+            if keep_energy_spectra:
+                dataset.energy_spectra[i] = energy_q_counts
+            dataset.spectra[i] = reduction.store(i, energy_q_counts)
+            reduction.progress(i+1, len(file_paths))
+    return dataset, reduction.windows, reduction.theta
+
+
+def rewindow_spectra(data_frame, energy_range: np.ndarray,
+                     energy_window_width: int = None):
+    """
+    Recomputes the spectra of the result of extract_spectra() or
+    stream_spectra() for new energy windows. Only the energy resolved spectra
+    are summed, no detector data is read.
+
+    Parameters
+    ----------
+    data_frame : ScanDataset | pd.DataFrame
+        Dataset with energy_spectra, or data frame with 'Energy_Spectra' and
+        their energies in data_frame.attrs['energies'].
+    energy_range : np.ndarray(numerical)
+        Energy values in keV to divide into windows. They must lie within the
+        energies resolved by the original reduction.
+    energy_window_width : int, optional
+        Width in keV of each window. Defaults to a single window.
+
+    Returns
+    -------
+    windows : dict
+        The energy windows and their values for later plotting.
+
+    """
+    energy_windows = split_energy_range(energy_range, energy_window_width)
+    if isinstance(data_frame, ScanDataset):
+        if data_frame.energy_spectra is None:
+            raise ValueError("The energy resolved spectra were not kept, see "
+                             "stream_spectra(keep_energy_spectra=True)")
+        # All files are windowed at once
+        data_frame.spectra = window_spectra(
+            data_frame.energy_spectra, data_frame.energies, energy_windows)
+        return dict(enumerate(energy_windows))
+    energies = data_frame.attrs['energies']
+    data_frame['Spectra'] = [
+        window_spectra(energy_q_counts, energies, energy_windows)
+        for energy_q_counts in data_frame['Energy_Spectra']]
+    return dict(enumerate(energy_windows))
+
+
+def split_energy_range(energy_range: np.ndarray, energy_window_width: int = None) -> list:
+    """
+    Divides an energy range into consecutive windows of energy_window_width
+    values, the last window may be shorter.
+    """
+    if energy_window_width is None:
+        energy_window_width = len(energy_range)
     split_indicies = np.arange(0, len(energy_range)-1, energy_window_width)
     # The first index returns an empty list since the first split index matches
     # the first energy index
-    energy_windows = np.split(energy_range, split_indicies)[1:]
-    data_frame['Spectra'] = None
-    # For each pixel in the detector, find it's angular distance from the incident
-    # beam and the q values it corresponds to across the total energy range collected
-    for x in range(data_dimensions[1]):
-        for y in range(data_dimensions[2]):
-            d = math.sqrt(((x+1)*.25-.25*transm_beam_x_pos) **
-                          2 + ((y+1)*.25-.25*transm_beam_y_pos)**2)
-            theta[y, x] = math.atan(d/samp_det_dist)
-            # TODO alter this to be agnostic of the det file's energy values
-            for e in range(data_dimensions[0]):
-                q_image[e, y, x] = (
-                    4*math.pi*(e+1)*math.sin(theta[y, x]/2))/1.24
-
-    # For each detector file, find the pixels that fall within the q range of
-    # interest and count the number of photons that they encountered.
-    # Repeat for each energy range of interest.
-    for i, detector_image in enumerate(data_frame['Image']):
-        q_counts = np.zeros([len(energy_windows), num_q_bins])
-        for j, window in enumerate(energy_windows):
-            # .hxt files are read in upside down
-            processed_image = detector_image[window, ::-1, :]
-            for k in range(0, num_q_bins):
-                # Find the pixels that fall within this q bin.
-                greater_than_lower_bound = q_image[window] >= q_range[k]
-                lower_than_upper_bound = q_image[window] < q_range[k+1]
-                mask = np.logical_and(greater_than_lower_bound,
-                                      lower_than_upper_bound)
-                if np.sum(mask) != 0:
-                    # Count the number of occurances
-                    q_counts[j, k] = processed_image[mask].sum()
-                else:
-                    q_counts[j, k] = 0
-        print("Files Completed:", i+1)
-        data_frame.at[i, 'Spectra'] = q_counts
-    # Energy windows are returned as a dictionary in case they are of uneven length
-    windows = {}
-    for i, x in enumerate(energy_windows):
-        windows[i] = x
-    # Return values for plotting, spectral data is appended to the data frame
-    return windows, theta
+    return np.split(energy_range, split_indicies)[1:]
+
 
+class _Reduction:
+    """
+    The parameters of extract_spectra() and the q bin lookup they define.
+    """
 
-def bundle_data(folder_path: str):
+    def __init__(self, data_dimensions: tuple, **kwargs):
+        # Default Values For Testing With Included Caffiene Data
+        samp_det_dist = kwargs.get(
+            'samp_det_dist') if 'samp_det_dist' in kwargs else 244
+        transm_beam_x_pos = kwargs.get(
+            'transm_beam_x_pos') if 'transm_beam_x_pos' in kwargs else 9
+        transm_beam_y_pos = kwargs.get(
+            'transm_beam_y_pos') if 'transm_beam_y_pos' in kwargs else 1
+        energy_range = kwargs.get(
+            'energy_range') if 'energy_range' in kwargs else np.arange(30, 80)
+        q_range = kwargs.get('q_range') if 'q_range' in kwargs else np.linspace(
+            0.04, 30.04, num=63)
+        energy_window_width = kwargs.get(
+            'energy_window_width') if 'energy_window_width' in kwargs else len(energy_range)
+        pixel_pitch = kwargs.get(
+            'pixel_pitch') if 'pixel_pitch' in kwargs else PIXEL_PITCH_mm
+        self.workers = kwargs.get('workers') if 'workers' in kwargs else 1
+        self.prefetch = kwargs.get('prefetch') if 'prefetch' in kwargs else 0
+        self.progress = kwargs.get('progress') or _print_progress
+        self.energies = np.asarray(kwargs.get('energies')) if 'energies' in kwargs else np.arange(
+            np.min(energy_range), np.max(energy_range)+1)
+        self.cache = kwargs.get('cache')
+        self.on_spectra = kwargs.get('on_spectra')
+        self.telemetry = kwargs.get('telemetry') or NO_TELEMETRY
+
+        self.energy_windows = split_energy_range(energy_range, energy_window_width)
+        # Each pixel's angular distance from the incident beam and the q values it
+        # corresponds to across the total energy range collected. The geometry is
+        # cached, so it is only computed once for repeated analyses.
+        with self.telemetry.span("geometry"):
+            geometry = detector_geometry(data_dimensions, samp_det_dist, transm_beam_x_pos,
+                                         transm_beam_y_pos, pixel_pitch)
+            self.theta = geometry.theta
+            # Every (energy, pixel) cell is assigned to its q bin once, so each file
+            # is reduced with a single bincount. Files are reduced at the detector's
+            # energy resolution, so the windows do not affect the reduction or the
+            # cache and can be changed afterwards.
+            self.lookup = geometry.q_bin_lookup(q_range, self.energies)
+        self.parameters_key = SpectraCache.parameters_key(
+            tuple(data_dimensions), samp_det_dist, transm_beam_x_pos,
+            transm_beam_y_pos, pixel_pitch, np.asarray(q_range).tolist(),
+            self.energies.tolist())
+
+    @property
+    def windows(self) -> dict:
+        # Energy windows are returned as a dictionary in case they are of uneven length
+        windows = {}
+        for i, x in enumerate(self.energy_windows):
+            windows[i] = x
+        return windows
+
+    def window(self, energy_q_counts: np.ndarray) -> np.ndarray:
+        """Sums an energy resolved spectrum into the energy windows"""
+        return window_spectra(energy_q_counts, self.energies, self.energy_windows)
+
+    def store(self, index: int, energy_q_counts: np.ndarray) -> np.ndarray:
+        """Windows the spectrum of the index-th file and hands it to on_spectra"""
+        with self.telemetry.span("windowing"):
+            q_counts = self.window(energy_q_counts)
+        if self.on_spectra is not None:
+            with self.telemetry.span("on_spectra"):
+                self.on_spectra(index, q_counts)
+        return q_counts
+
+    def reduce(self, sources: list):
+        """
+        Yields the energy resolved spectra of every source, a .hxt file path or a detector
+        image, in order. Files found in the cache are neither read nor binned.
+        """
+        if self.cache is None:
+            yield from self.__reduce_uncached(sources)
+            return
+        keys = [SpectraCache.key(source, self.parameters_key)
+                if isinstance(source, str) else None for source in sources]
+        # Only which files are cached is looked up front, each hit is read when
+        # its turn comes, so hits are not all held in memory at once
+        hits = self.cache.contains([key for key in keys if key is not None])
+        missed = self.__reduce_uncached(
+            [source for source, key in zip(sources, keys) if key not in hits])
+        with closing(missed):
+            for source, key in zip(sources, keys):
+                if key not in hits:
+                    q_counts = next(missed)
+                    if key is not None:
+                        self.cache.put(key, q_counts)
+                    yield q_counts
+                    continue
+                q_counts = self.cache.get(key)
+                if q_counts is None:
+                    # Evicted since the lookup, e.g. by the puts of the misses
+                    with closing(self.__reduce_uncached([source])) as reduced:
+                        q_counts = next(reduced)
+                    self.cache.put(key, q_counts)
+                yield q_counts
+
+    def __reduce_uncached(self, sources: list):
+        # Images read from a path are released as soon as they are reduced. The
+        # work of parallel workers is only timed as a whole, by the caller's span
+        if self.workers > 1 and len(sources) > 1:
+            yield from parallel_reduce(self.lookup, sources, self.workers)
+            return
+        # Images of the paths, read ahead while the previous ones are binned
+        images = _read_images([source for source in sources if isinstance(source, str)],
+                              self.prefetch, self.telemetry)
+        with closing(images):
+            for source in sources:
+                if isinstance(source, str):
+                    # Without prefetching only the header is read, the counts
+                    # are paged in by the binning
+                    with self.telemetry.span("read"):
+                        source = next(images)
+                with self.telemetry.span("binning"):
+                    energy_q_counts = self.lookup.reduce(source)
+                yield energy_q_counts
+
+
+def _print_progress(completed: int, total: int):
+    print("Files Completed:", completed)
+
+
+def _read_images(file_paths: list, prefetch: int = 0, telemetry=NO_TELEMETRY):
+    """
+    Yields the [energy, ...] image of every file in order, as hxtV3Read() does
+    or read ahead by a PrefetchReader of depth prefetch. A prefetched image is
+    only valid until the next one is requested.
+    """
+    if not prefetch:
+        for file in file_paths:
+            yield hxtV3Read(file)[0]
+        return
+    with PrefetchReader(file_paths, prefetch) as reader:
+        try:
+            yield from reader
+        finally:
+            telemetry.record("prefetch", reader.stats())
+
+
+def bundle_data(folder_path, images_path: str = None, compact: bool = False,
+                sparse: bool = False, prefetch: int = 0) -> ScanDataset:
     """
-    Constructs a data frame containing the data from each indi
+    Constructs a dataset containing the data from each individual file.
+
     Parameters
     ----------
-    folder_path : str
-        Path to the folder containing the .
+    folder_path : str | list of str
+        Glob pattern matching the files to load, or an explicit list of file
+        paths (e.g. from HxtCatalog.paths()) which is loaded in the given order.
+    images_path : str, optional
+        If given, the images are copied into a memory mapped .npy file at this
+        location instead of into memory.
+    compact : bool
+        Stores the counts in the smallest type that holds all of them exactly,
+        usually uint16 or uint32 instead of the float64 of the files, see
+        counts.compact_dtype(). Costs an extra pass over the files.
+    sparse : bool
+        Keeps only the nonzero cells of every image, as SparseFrames, for low
+        count data. images_path and compact do not apply, sparse counts are
+        always compact.
+    prefetch : int
+        Files read ahead on reader threads while the current one is copied,
+        see PrefetchReader. 0, the default, reads the files one by one.
 
     Returns
     -------
-    ret_frame : pd.DataFrame
-        Pandas data frame.
+    dataset : ScanDataset
+        The images, energy bins and header metadata of every file, in one
+        [file, ...] array each. Use dataset.to_data_frame() for a data frame.
 
     """
-    raw_files = glob.glob(folder_path)
-    temp = []
-    for i, file in enumerate(raw_files):
-        # Edit this line for alternative file types: V
-        image, bins = hxtV3Read(file)
-        temp.append({"Image": image, "Energy_Bins_Sampled_By_Detector": bins})
-    ret_frame = pd.DataFrame(temp)
-    return ret_frame
+    if isinstance(folder_path, str):
+        raw_files = glob.glob(folder_path)
+    else:
+        raw_files = list(folder_path)
+    headers = [hxtV3ReadHeader(file) for file in raw_files]
+    for file, header in zip(raw_files, headers):
+        if header is None:
+            raise ValueError(f"Not Version 3 of HXT File: {file}")
+    # Shape of the [energy, ...] view returned by hxtV3Read
+    shapes = {(header["nBins"], header["nCols"], header["nRows"]) for header in headers}
+    if len(shapes) > 1:
+        raise ValueError(f"Files have different detector shapes: {sorted(shapes)}")
+    shape = (len(raw_files),) + (shapes.pop() if shapes else (0, 0, 0))
+    bins = np.stack([header["bins"] for header in headers]) if headers else None
+    metadata = ScanDataset.metadata_from_headers(raw_files, headers)
+    if sparse:
+        # Each file is released as soon as its nonzero cells are collected
+        images = SparseFrames.from_frames(
+            [SparseFrame.from_dense(image) for image in _read_images(raw_files, prefetch)],
+            shape[1:])
+        return ScanDataset(metadata, images, bins)
+    dtype = np.float64
+    if compact:
+        # Every file must fit, so the type is chosen before the images are copied
+        dtype = np.result_type(*[compact_dtype(hxtV3Read(file)[0]) for file in raw_files],
+                               COUNT_DTYPES[0])
+    if images_path is None:
+        images = np.empty(shape, dtype=dtype)
+    else:
+        images = np.lib.format.open_memmap(images_path, mode="w+", dtype=dtype, shape=shape)
+    # Edit _read_images() for alternative file types
+    for i, image in enumerate(_read_images(raw_files, prefetch)):
+        images[i] = image
+    return ScanDataset(metadata, images, bins)
 
 
 def create_spectral_heatmap(data_frame: pd.DataFrame, region_to_analyze: list, scans_per_row: int):
@@ -240,24 +595,14 @@ def create_spectral_heatmap(data_frame: pd.DataFrame, region_to_analyze: list, s
     integral_max_index = np.absolute(q_range-integral_q_end).argmin()
     integral_index_range = np.arange(integral_min, integral_max)
     """
-    image_width = scans_per_row
-    ret_image = np.zeros([math.ceil(
-        len(data_frame)/image_width), image_width])
-    aups = np.array(data_frame.apply(
-        lambda x: np.trapz(x[region_to_analyze])).tolist())
-    image_height = math.floor(len(aups)/image_width)-1
-    for i, aup in enumerate(aups):
-        y = i/image_width
-        x = i % image_width
-        if y % 2 < 1:
-            ret_image[image_height-math.floor(y), x] = aup
-        else:
-            ret_image[image_height -
-                      math.floor(y), image_width-1-x] = aup
+    maps, aups = scan_map.roi_maps(
+        np.stack(list(data_frame)), [region_to_analyze], scans_per_row)
+    ret_image, aups = maps[0], aups[0]
+    import matplotlib.pyplot as plt
     fig = plt.figure()
     ax = fig.add_subplot()
-    ax.pcolormesh(ret_image, cmap='jet', vmin=aups.min())
-    plt.colorbar(mappable=fig, cmap='jet', label="AUP", orientation="vertical")
+    mesh = ax.pcolormesh(ret_image, cmap='jet', vmin=aups.min())
+    fig.colorbar(mappable=mesh, cmap='jet', label="AUP", orientation="vertical")
     ax.set_aspect(1.0/ax.get_data_ratio(), adjustable='box')
     plt.show()
     return fig
@@ -281,6 +626,7 @@ def plot_3d_spectra(spectra: pd.Series, q_range: np.ndarray, plot_type: str, win
     None.
 
     """
+    import matplotlib.pyplot as plt
     fig = plt.figure()
     ax = fig.add_subplot(projection='3d')
     if plot_type == "windowing":
@@ -0,0 +1,122 @@
+"""
+Array backed container of the detector data and spectra of a set of .hxt files.
+
+Every per-file quantity is one slice of a preallocated array, so downstream
+operations work on whole arrays instead of a pandas column of objects.
+"""
+
+import numpy as np
+import pandas as pd
+from models.sparse_frames import SparseFrames
+
+
+class ScanDataset:
+    """
+    Detector data, metadata and spectra of a set of files, indexed by file.
+
+    Attributes
+    ----------
+    metadata : np.ndarray
+        Structured [n_files] array with the 'file' path and the header fields
+        of METADATA_FIELDS.
+    images : np.ndarray
+        [n_files, energy, col, row] raw detector images in the orientation of
+        hxtV3Read(), in memory or memory mapped. float64 as in the files, or
+        a compact count type, see counts.compact_dtype(). A SparseFrames of
+        the nonzero cells for sparse datasets, None for streamed datasets.
+    bins : np.ndarray
+        [n_files, n_bins] energy bins sampled by the detector.
+    energies : np.ndarray
+        Energy index of every row of energy_spectra.
+    energy_spectra : np.ndarray
+        [n_files, n_energies, n_q_bins] energy resolved spectra, None if they
+        were not kept, see allocate_spectra().
+    spectra : np.ndarray
+        [n_files, n_windows, n_q_bins] spectra of the energy windows.
+    """
+
+    __slots__ = ("metadata", "images", "bins", "energies", "energy_spectra", "spectra")
+
+    # Stage positions recorded in the .hxt headers
+    POSITION_FIELDS = ("mssX", "mssY", "mssZ", "MssRot",
+                       "GalX", "GalY", "GalZ", "GalRot", "GalRot2")
+    METADATA_FIELDS = POSITION_FIELDS + ("filePreFix", "timestamp")
+
+    def __init__(self, metadata: np.ndarray, images: np.ndarray = None, bins: np.ndarray = None):
+        self.metadata = metadata
+        self.images = images
+        self.bins = bins
+        self.energies: np.ndarray = None
+        self.energy_spectra: np.ndarray = None
+        self.spectra: np.ndarray = None
+
+    def __len__(self) -> int:
+        return len(self.metadata)
+
+    @property
+    def files(self) -> np.ndarray:
+        return self.metadata["file"]
+
+    @staticmethod
+    def metadata_dtype(file_length: int) -> np.dtype:
+        return np.dtype(
+            [("file", f"U{max(file_length, 1)}")]
+            + [(field, np.int64) for field in ScanDataset.POSITION_FIELDS]
+            + [("filePreFix", "U100"), ("timestamp", "U16")])
+
+    @staticmethod
+    def metadata_from_headers(files: list, headers: list) -> np.ndarray:
+        """
+        Builds the metadata array from the file paths and their header
+        dictionaries, as returned by hxtV3ReadHeader() or HxtCatalog.entries().
+        """
+        metadata = np.zeros(len(files), dtype=ScanDataset.metadata_dtype(
+            max((len(file) for file in files), default=1)))
+        metadata["file"] = files
+        for field in ScanDataset.METADATA_FIELDS:
+            metadata[field] = [header[field] for header in headers]
+        return metadata
+
+    def energy_slab(self, index: int, start: int, stop: int) -> np.ndarray:
+        """
+        float64 [energy, col, row] counts of the index-th image for the energies
+        start..stop-1, for dense and sparse images.
+        """
+        if isinstance(self.images, SparseFrames):
+            return self.images[index].energy_slab(start, stop)
+        return np.asarray(self.images[index][start:stop], dtype=np.float64)
+
+    def allocate_spectra(self, energies: np.ndarray, num_windows: int, num_q_bins: int,
+                         energy_resolved: bool = True):
+        """
+        Preallocates the spectra of every file. The energy resolved spectra,
+        n_energies / num_windows times the size of the windowed ones, are only
+        allocated if energy_resolved.
+        """
+        self.energies = energies
+        self.energy_spectra = None
+        if energy_resolved:
+            self.energy_spectra = np.zeros((len(self), len(energies), num_q_bins))
+        self.spectra = np.zeros((len(self), num_windows, num_q_bins))
+
+    def to_data_frame(self) -> pd.DataFrame:
+        """
+        The dataset as a data frame with one row per file, in the layout of the
+        former bundle_data() and extract_spectra() results. Array columns hold
+        views of the dataset's arrays.
+        """
+        columns = {"File": self.files}
+        for field in self.METADATA_FIELDS:
+            columns[field] = self.metadata[field]
+        if self.images is not None:
+            columns["Image"] = list(self.images)
+        if self.bins is not None:
+            columns["Energy_Bins_Sampled_By_Detector"] = list(self.bins)
+        if self.energy_spectra is not None:
+            columns["Energy_Spectra"] = list(self.energy_spectra)
+        if self.spectra is not None:
+            columns["Spectra"] = list(self.spectra)
+        ret_frame = pd.DataFrame(columns)
+        if self.energies is not None:
+            ret_frame.attrs["energies"] = self.energies
+        return ret_frame
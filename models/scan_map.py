@@ -0,0 +1,189 @@
+"""
+Vectorized reconstruction of scan maps from the spectra of every scan position.
+
+The spectra of a scan are stacked into one array, every q region of interest
+is integrated with a single matrix product, and the values are arranged into
+the raster layout with reshapes and flips instead of a loop over the scans.
+"""
+
+import math
+import numpy as np
+
+
+def trapezoid_weights(rois: list, num_q_bins: int) -> np.ndarray:
+    """
+    Weights that turn np.trapz(spectrum[roi]) into a dot product.
+
+    The trapezoidal rule with unit spacing weighs the first and last sample of
+    a region by 1/2 and the samples in between by 1.
+
+    Parameters
+    ----------
+    rois : list of np.ndarray
+        q bin indices of every region of interest, as used for np.trapz.
+    num_q_bins : int
+        Length of the spectra.
+
+    Returns
+    -------
+    np.ndarray
+        [n_rois, n_q_bins] weights.
+    """
+    weights = np.zeros((len(rois), num_q_bins))
+    for i, roi in enumerate(rois):
+        roi = np.asarray(roi, dtype=np.intp)
+        # A single sample has no area
+        if len(roi) < 2:
+            continue
+        np.add.at(weights[i], roi[:-1], 0.5)
+        np.add.at(weights[i], roi[1:], 0.5)
+    return weights
+
+
+def integrate_rois(spectra: np.ndarray, rois: list) -> np.ndarray:
+    """
+    Integrates every spectrum over every region of interest at once.
+
+    Parameters
+    ----------
+    spectra : np.ndarray
+        [..., n_q_bins] spectra, e.g. [n_scans, n_q_bins].
+    rois : list of np.ndarray
+        q bin indices of every region of interest.
+
+    Returns
+    -------
+    np.ndarray
+        [n_rois, ...] area under each spectrum in each region.
+    """
+    spectra = np.asarray(spectra, dtype=np.float64)
+    weights = trapezoid_weights(rois, spectra.shape[-1])
+    return np.moveaxis(spectra @ weights.T, -1, 0)
+
+
+def serpentine_image(values: np.ndarray, scan_width: int) -> np.ndarray:
+    """
+    Arranges values collected in a raster pattern that alternates direction
+    every row into a 2D image, the first scan row at the bottom.
+
+    Scans missing from an incomplete last row are left at zero, and that row
+    is placed in the top row of the image.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        [..., n_scans] value of every scan in acquisition order.
+    scan_width : int
+        Number of scans per row.
+
+    Returns
+    -------
+    np.ndarray
+        [..., ceil(n_scans / scan_width), scan_width] images.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    num_scans = values.shape[-1]
+    num_rows = math.ceil(num_scans / scan_width)
+    padded = np.zeros(values.shape[:-1] + (num_rows * scan_width,))
+    padded[..., :num_scans] = values
+    rows = padded.reshape(values.shape[:-1] + (num_rows, scan_width))
+    # Every other row was scanned in the opposite direction
+    rows[..., 1::2, :] = rows[..., 1::2, ::-1]
+    image = np.empty_like(rows)
+    # Complete rows are stacked upwards from the bottom of the image, an
+    # incomplete last row wraps around to the top
+    image_height = math.floor(num_scans / scan_width) - 1
+    image[..., (image_height - np.arange(num_rows)) % max(num_rows, 1), :] = rows
+    return image
+
+
+def roi_maps(spectra: np.ndarray, rois: list, scan_width: int):
+    """
+    Builds the map of every region of interest of a serpentine scan.
+
+    Parameters
+    ----------
+    spectra : np.ndarray
+        [n_scans, n_q_bins] spectra in acquisition order.
+    rois : list of np.ndarray
+        q bin indices of every region of interest.
+    scan_width : int
+        Number of scans per row.
+
+    Returns
+    -------
+    maps : np.ndarray
+        [n_rois, n_rows, scan_width] reconstructed maps.
+    aups : np.ndarray
+        [n_rois, n_scans] area under the peak of each scan.
+    """
+    aups = integrate_rois(spectra, rois)
+    return serpentine_image(aups, scan_width), aups
+
+
+def serpentine_cells(num_scans: int, scan_width: int):
+    """
+    Row and column of every scan in the image of serpentine_image().
+
+    Returns
+    -------
+    rows, columns : np.ndarray
+        [n_scans] image cell of each scan in acquisition order.
+    shape : tuple
+        (rows, columns) of the image.
+    """
+    num_rows = math.ceil(num_scans / scan_width)
+    scan_row, x = np.divmod(np.arange(num_scans), scan_width)
+    columns = np.where(scan_row % 2 == 0, x, scan_width - 1 - x)
+    image_height = math.floor(num_scans / scan_width) - 1
+    rows = (image_height - scan_row) % max(num_rows, 1)
+    return rows, columns, (num_rows, scan_width)
+
+
+def position_cells(x: np.ndarray, y: np.ndarray, decimals: int = 3):
+    """
+    Row and column of every scan in the image of position_image().
+
+    Returns
+    -------
+    rows, columns : np.ndarray
+        [n_scans] image cell of each scan.
+    x_coords, y_coords : np.ndarray
+        Stage position of every column and row of the image.
+    """
+    x_coords, columns = np.unique(
+        np.round(np.asarray(x, dtype=np.float64), decimals), return_inverse=True)
+    y_coords, rows = np.unique(
+        np.round(np.asarray(y, dtype=np.float64), decimals), return_inverse=True)
+    return rows, columns, x_coords, y_coords
+
+
+def position_image(values: np.ndarray, x: np.ndarray, y: np.ndarray, decimals: int = 3):
+    """
+    Scatters values into a grid indexed by the stage position of every scan,
+    so the map does not depend on the order or completeness of the files.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        [..., n_scans] value of every scan, in any order.
+    x, y : np.ndarray
+        [n_scans] stage position of every scan.
+    decimals : int
+        Positions are rounded to this many decimals before being matched to a
+        grid column or row.
+
+    Returns
+    -------
+    image : np.ndarray
+        [..., len(y_coords), len(x_coords)] images, the lowest y in the first
+        row. Positions without a scan are NaN, of repeated positions the last
+        scan is kept.
+    x_coords, y_coords : np.ndarray
+        Stage position of every column and row of the image.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rows, columns, x_coords, y_coords = position_cells(x, y, decimals)
+    image = np.full(values.shape[:-1] + (len(y_coords), len(x_coords)), np.nan)
+    image[..., rows, columns] = values
+    return image, x_coords, y_coords
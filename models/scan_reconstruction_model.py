@@ -1,12 +1,18 @@
+from contextlib import nullcontext
 from enum import Enum
-from typing import Dict
+import glob
+import os
+from typing import Callable, Dict
 import numpy as np
 from models import sSAXS_tools as s
-import pandas as pd
-from matplotlib import pyplot as plt
-from utils import PlotUtils
-import math
-import os
+from models import rendering, scan_map
+from models.hxt_catalog import HxtCatalog
+from models.q_binning import window_spectra
+from models.result_cube import ResultCube
+from models.scan_dataset import ScanDataset
+from models.spectra_cache import SpectraCache
+from models.telemetry import NO_TELEMETRY, Telemetry
+from models.figure_set import FigureSet
 
 
 class ScanReconstructionModel:
@@ -32,6 +38,29 @@ class ScanReconstructionModel:
         q_END = "global_q_end"
         TRANSMISSION_BEAM_X = "transmission_beam_x"
         TRANSMISSION_BEAM_Y = "transmission_beam_y"
+        WORKERS = "workers"
+        SPECTRA_CACHE_PATH = "spectra_cache_path"
+        MAP_LAYOUT = "map_layout"
+        RESULT_CUBE_PATH = "result_cube_path"
+        WATERFALL_LINES = "waterfall_lines"
+        PREFETCH = "prefetch"
+        KEEP_ENERGY_SPECTRA = "keep_energy_spectra"
+
+    class MapLayout(str, Enum):
+        """
+        How the scans are arranged into a map: by acquisition order in a right to
+        left raster with rows of SCAN_WIDTH scans, or by the stage positions
+        recorded in the .hxt headers.
+        """
+        SERPENTINE = "serpentine"
+        MSS_STAGE = "mss_stage"
+        GAL_STAGE = "gal_stage"
+
+    # Header fields holding the (x, y) position of each stage layout
+    STAGE_POSITION_FIELDS = {
+        MapLayout.MSS_STAGE: ("mssX", "mssY"),
+        MapLayout.GAL_STAGE: ("GalX", "GalY"),
+    }
 
     def __init__(self, data: Dict[Property, object]):
         """
@@ -68,39 +97,269 @@ class ScanReconstructionModel:
         self.transmission_beam_y = data.get(self.Property.TRANSMISSION_BEAM_Y)
         self.file_extension = data.get(self.Property.FILE_EXTENSION)
         self.scan_width = data.get(self.Property.SCAN_WIDTH)
+        # Number of processes used to reduce the scan files
+        self.workers = data.get(self.Property.WORKERS, 1)
+        # Files read ahead on threads while one is reduced, when not using workers
+        self.prefetch = data.get(self.Property.PREFETCH, 2)
+        # The energy resolved spectra of every file, which window_heatmaps()
+        # needs, are many times the size of the windowed ones
+        self.keep_energy_spectra = data.get(self.Property.KEEP_ENERGY_SPECTRA, False)
+        # Reduced spectra are cached on disk, an empty path disables the cache
+        self.spectra_cache_path = data.get(
+            self.Property.SPECTRA_CACHE_PATH, SpectraCache.default_path())
+        self.map_layout = self.MapLayout(
+            data.get(self.Property.MAP_LAYOUT, self.MapLayout.SERPENTINE))
+        # The [row, column, window, q] spectra of the scan are written to this
+        # .npy file, if given, see result_cube
+        self.result_cube_path = data.get(self.Property.RESULT_CUBE_PATH)
+        self._result_cube: np.ndarray = None
+        # Stage position of every map column and row, None for the serpentine layout
+        self.map_x: np.ndarray = None
+        self.map_y: np.ndarray = None
         self.theta: np.ndarray = None
-        self.dataframe = pd.DataFrame()
-        self.figures = {}
+        self.heatmap: np.ndarray = None
+        self.aups: np.ndarray = None
+        self.dataset: ScanDataset = None
+        # Spectra drawn at most by the 3D plot, evenly picked from larger scans
+        self.waterfall_lines = data.get(
+            self.Property.WATERFALL_LINES, rendering.MAX_LINES)
+        self.figures = FigureSet()
+        # Spans of analyze() and plot(), replaced by an enabled Telemetry to profile
+        self.telemetry: Telemetry = NO_TELEMETRY
 
-    def reconstruct_scan(self):
+    def reconstruct_scan(self) -> FigureSet:
         """
         Performs the spectral analysis on each file plots them in aggregate, then
         integrates each spectrum at the region of interest and plots a map of the values.
 
+        Returns
+        -------
+        FigureSet
+            The figures, see plot().
+
+        """
+        self.analyze()
+        self.plot()
+        return self.figures
+
+    def analyze(self, progress: Callable[[int, int], None] = None):
+        """
+        Performs the spectral analysis on each file. No figures are created, so
+        this can run off the Tk thread.
+
+        Parameters
+        ----------
+        progress : Callable[[int, int], None], optional
+            Called with (files completed, total files), see extract_spectra().
+
         Returns
         -------
         None.
 
         """
-        sample_data = s.bundle_data(
-            os.path.join(self.sample_file_path, f"*{self.file_extension}"))
-        background_data = s.bundle_data(self.background_file_path)
-        self.data_frame = pd.concat(
-            [sample_data, background_data], ignore_index=True)
-        self.windows, self.theta = s.extract_spectra(
-            self.data_frame,
-            samp_det_dist=self.detector_distance,
-            transm_beam_x_pos=self.transmission_beam_x,
-            transm_beam_y_pos=self.transmission_beam_y,
-            energy_range=self.energy_range,
-            q_range=self.q_range)
-        spectra = self.data_frame["Spectra"]
+        # The header catalog is kept next to the data, so reopening a large
+        # directory only rereads the headers of new or modified files
+        with self.telemetry.span("catalog"), \
+                HxtCatalog(self.sample_file_path, self.file_extension) as catalog:
+            catalog.refresh()
+            entries = catalog.entries()
+            invalid_paths = catalog.invalid_paths()
+        # Skipping a file would shift every later scan to the wrong map cell
+        if invalid_paths:
+            raise ValueError(
+                f"{len(invalid_paths)} file(s) are unreadable or not Version 3 of HXT "
+                f"File: {', '.join(invalid_paths[:5])}"
+                + (", ..." if len(invalid_paths) > 5 else ""))
+        sample_files = [entry["path"] for entry in entries]
+        # The background path may be a pattern, like the ones bundle_data() globs
+        background_files = glob.glob(self.background_file_path)
+        if len(background_files) != 1:
+            raise ValueError(
+                f"Background path must match exactly one file, it matches "
+                f"{len(background_files)}: {self.background_file_path}")
+        background_file = background_files[0]
+        self._result_cube = None
+        # The background file is appended to the end. Files are streamed: each
+        # one is reduced to its spectra and released before the next is read,
+        # unless its spectra are already cached.
+        with (SpectraCache(self.spectra_cache_path) if self.spectra_cache_path
+              else nullcontext()) as cache, \
+                (self.__create_result_cube(entries) if self.result_cube_path
+                 else nullcontext()) as result_cube, \
+                self.telemetry.span("stream_spectra"):
+            self.dataset, self.windows, self.theta = s.stream_spectra(
+                sample_files + [background_file],
+                headers=entries + [s.hxtV3ReadHeader(background_file)],
+                samp_det_dist=self.detector_distance,
+                transm_beam_x_pos=self.transmission_beam_x,
+                transm_beam_y_pos=self.transmission_beam_y,
+                energy_range=self.energy_range,
+                q_range=self.q_range,
+                workers=self.workers,
+                prefetch=self.prefetch,
+                keep_energy_spectra=self.keep_energy_spectra,
+                progress=progress,
+                cache=cache,
+                on_spectra=None if result_cube is None else result_cube.write,
+                telemetry=self.telemetry)
+        with self.telemetry.span("map"):
+            self.heatmap, self.aups = self.__build_heatmap(self.dataset.spectra)
+
+    @property
+    def result_cube(self) -> np.ndarray:
         """
-        Plotting
+        The read-only [row, column, window, q] spectra of the last analysis,
+        memory mapped from result_cube_path on first use. Cells without a scan
+        are NaN. None if no cube was written.
         """
-        self.figures['heatmap'] = self.__create_spectral_heatmap()
-        self.figures['raster_3d'] = self.__plot_3d_spectra()
-        plt.show(block=False)
+        if self._result_cube is None and self.result_cube_path \
+                and os.path.exists(self.result_cube_path):
+            self._result_cube = ResultCube.open(self.result_cube_path)
+        return self._result_cube
+
+    def __create_result_cube(self, entries: list) -> ResultCube:
+        """
+        Creates the result cube with one cell per map pixel for the sample
+        files of the catalog entries, in the map_layout.
+        """
+        axes = {"q_range": self.q_range}
+        energy_windows = s.split_energy_range(self.energy_range)
+        axes["window_start_keV"] = [window[0] for window in energy_windows]
+        axes["window_end_keV"] = [window[-1] for window in energy_windows]
+        if self.map_layout == self.MapLayout.SERPENTINE:
+            rows, columns, map_shape = scan_map.serpentine_cells(
+                len(entries), self.scan_width)
+        else:
+            x_field, y_field = self.STAGE_POSITION_FIELDS[self.map_layout]
+            rows, columns, axes["map_x"], axes["map_y"] = scan_map.position_cells(
+                [entry[x_field] for entry in entries], [entry[y_field] for entry in entries])
+            map_shape = (len(axes["map_y"]), len(axes["map_x"]))
+        return ResultCube(self.result_cube_path, map_shape,
+                          (len(energy_windows), len(self.q_range) - 1),
+                          rows, columns, **axes)
+
+    def window_heatmaps(self, energy_window_width: int) -> dict:
+        """
+        Builds a map of the region of interest for every energy window of the
+        given width, from the energy resolved spectra of analyze(), which are
+        only kept with KEEP_ENERGY_SPECTRA. No detector data is reread.
+
+        Parameters
+        ----------
+        energy_window_width : int
+            Width in keV of the energy windows.
+
+        Returns
+        -------
+        windows : dict
+            The energy values of each window, by window index.
+        heatmaps : dict
+            The (ret_image, aups) of each window, by window index, see
+            __build_heatmap().
+
+        """
+        if self.dataset.energy_spectra is None:
+            raise ValueError("The energy resolved spectra were not kept, set "
+                             f"{self.Property.KEEP_ENERGY_SPECTRA.value} before analyze()")
+        energy_windows = s.split_energy_range(self.energy_range, energy_window_width)
+        # [scan, window, q] spectra of the samples, the background is last
+        spectra = window_spectra(
+            self.dataset.energy_spectra[:-1], self.dataset.energies, energy_windows)
+        # Every window is integrated and arranged in one pass
+        aups = scan_map.integrate_rois(spectra, [self.integral_q_range])[0].T
+        maps = self.__arrange(aups)
+        windows = dict(enumerate(energy_windows))
+        return windows, {i: (maps[i], aups[i]) for i in windows}
+
+    def plot(self, figures: FigureSet = None):
+        """
+        Plots the aggregate spectra and the map of the region of interest from
+        the results of analyze(). Must run on the thread that owns the GUI.
+
+        Parameters
+        ----------
+        figures : FigureSet, optional
+            Figures of a previous analysis to redraw, e.g. the ones embedded
+            in the GUI. New figures are created if None.
+
+        Returns
+        -------
+        None.
+
+        """
+        if figures is not None:
+            self.figures = figures
+        with self.telemetry.span("plot"):
+            with self.telemetry.span("heatmap"):
+                self.__create_spectral_heatmap()
+            with self.telemetry.span("raster_3d"):
+                self.__plot_3d_spectra()
+
+    def roi_heatmaps(self, q_regions: list, window: int = 0):
+        """
+        Builds the map of several q regions of interest at once from the
+        spectra of analyze().
+
+        Parameters
+        ----------
+        q_regions : list of (float, float)
+            (start, end) momentum transfer of every region, snapped to the q
+            bin edges like the integral q range.
+        window : int
+            Energy window to integrate.
+
+        Returns
+        -------
+        maps : np.ndarray
+            [n_regions, rows, columns] reconstructed maps, see map_layout.
+        aups : np.ndarray
+            [n_regions, n_scans] area under the peak of each scan, in file order.
+
+        """
+        rois = [np.arange(np.absolute(self.q_range - q_start).argmin(),
+                          np.absolute(self.q_range - q_end).argmin())
+                for q_start, q_end in q_regions]
+        aups = scan_map.integrate_rois(self.dataset.spectra[:-1, window], rois)
+        return self.__arrange(aups), aups
+
+    def __build_heatmap(self, spectra: np.ndarray, window: int = 0):
+        """
+        Integrates each sample spectrum over the region of interest and arranges
+        the values into the scan's 2D layout.
+
+        Parameters
+        ----------
+        spectra : np.ndarray
+            [file, window, q] spectra, the background last.
+        window : int
+            Energy window to integrate.
+
+        Returns
+        -------
+        ret_image : np.ndarray
+            The reconstructed map.
+        aups : np.ndarray
+            Area under the peak of each scan, in file order.
+
+        """
+        aups = scan_map.integrate_rois(spectra[:-1, window], [self.integral_q_range])[0]
+        return self.__arrange(aups), aups
+
+    def __arrange(self, aups: np.ndarray) -> np.ndarray:
+        """
+        Arranges [..., n_scans] values into [..., rows, columns] maps following
+        map_layout. Stage layouts also set map_x and map_y, positions without a
+        scan are NaN.
+        """
+        if self.map_layout == self.MapLayout.SERPENTINE:
+            self.map_x, self.map_y = None, None
+            return scan_map.serpentine_image(aups, self.scan_width)
+        x_field, y_field = self.STAGE_POSITION_FIELDS[self.map_layout]
+        # Stage positions of the samples, the background is last
+        samples = self.dataset.metadata[:-1]
+        image, self.map_x, self.map_y = scan_map.position_image(
+            aups, samples[x_field], samples[y_field])
+        return image
 
     def __create_spectral_heatmap(self):
         """
@@ -112,28 +371,13 @@ class ScanReconstructionModel:
             DESCRIPTION.
 
         """
-        # Reconstructs a 2D scan assuming the data were collected in a right to left
-        # raster pattern with rows of equal width.
-        data_frame = self.data_frame[:-1]
-        ret_image = np.zeros(
-            [math.ceil(len(data_frame) / self.scan_width), self.scan_width])
-        spectra = data_frame["Spectra"]
-        aups = np.array(
-            spectra.apply(lambda x: np.trapz(
-                x[0, self.integral_q_range])).tolist()
-        )
-        image_height = math.floor(len(aups) / self.scan_width) - 1
-        for i, aup in enumerate(aups):
-            y = i / self.scan_width
-            x = i % self.scan_width
-            if y % 2 < 1:
-                ret_image[image_height - math.floor(y), x] = aup
-            else:
-                ret_image[image_height -
-                          math.floor(y), self.scan_width - 1 - x] = aup
-        fig = plt.figure()
+        fig = self.figures.figure('heatmap')
         ax = fig.add_subplot()
-        mesh = ax.pcolormesh(ret_image, cmap="jet", vmin=aups.min())
+        if self.map_x is None:
+            mesh = ax.pcolormesh(self.heatmap, cmap="jet", vmin=self.aups.min())
+        else:
+            mesh = ax.pcolormesh(self.map_x, self.map_y, self.heatmap, shading="nearest",
+                                 cmap="jet", vmin=self.aups.min())
         fig.colorbar(mappable=mesh, cmap="jet",
                      label="AUP", orientation="vertical")
         ax.set_aspect(1.0 / ax.get_data_ratio(), adjustable="box")
@@ -150,20 +394,14 @@ class ScanReconstructionModel:
 
         """
         # open beam will be appended to the end
-        spectra = self.data_frame["Spectra"]
+        spectra = self.dataset.spectra[:, 0]
         q_range = self.q_range[:-1]
-        fig = plt.figure()
+        fig = self.figures.figure('raster_3d')
         ax = fig.add_subplot(projection="3d")
-        bg_sub_data = spectra.apply(
-            lambda x: np.subtract(x, spectra[len(spectra) - 1]))
-        bg_sub_data = bg_sub_data[0:-1]
-        for x in range(len(bg_sub_data)):
-            ax.plot3D(
-                q_range,
-                [x] * len(q_range),
-                np.reshape(spectra.iloc[x], (len(q_range)))
-                - np.reshape(spectra.iloc[-1], (len(q_range))))
-            ax.set_ylabel("Scan Number")
+        bg_sub_data = spectra[:-1] - spectra[-1]
+        rendering.waterfall(ax, q_range, np.arange(len(bg_sub_data)), bg_sub_data,
+                            max_lines=self.waterfall_lines)
+        ax.set_ylabel("Scan Number")
         ax.set_xlabel("${q(nm^{-1})}$")
         ax.set_zlabel("Counts")
         ax.grid(False)
@@ -0,0 +1,123 @@
+"""
+Sparse storage of low-count detector images.
+
+At low flux and high energies most cells of an [energy, col, row] image are
+zero. A SparseFrame keeps only the flat index and count of its nonzero cells,
+and SparseFrames concatenates the frames of many files CSR style, so memory and
+reduction time scale with the number of counts rather than the image size.
+"""
+
+import numpy as np
+from models.counts import compact
+
+
+class SparseFrame:
+    """
+    Nonzero cells of one detector image.
+
+    Attributes
+    ----------
+    shape : tuple
+        (energy, col, row) shape of the dense image.
+    indices : np.ndarray
+        Increasing flat (C order) index of every nonzero cell.
+    counts : np.ndarray
+        Count of every nonzero cell, in a compact type.
+    """
+
+    __slots__ = ("shape", "indices", "counts")
+
+    def __init__(self, shape: tuple, indices: np.ndarray, counts: np.ndarray):
+        self.shape = tuple(shape)
+        self.indices = indices
+        self.counts = counts
+
+    @classmethod
+    def from_dense(cls, image: np.ndarray) -> "SparseFrame":
+        """Collects the nonzero cells of a dense image, e.g. from hxtV3Read()"""
+        nonzero = np.nonzero(image)
+        indices = np.ravel_multi_index(nonzero, image.shape)
+        index_dtype = np.uint32 if image.size <= np.iinfo(np.uint32).max else np.int64
+        return cls(image.shape, indices.astype(index_dtype), compact(image[nonzero]))
+
+    @property
+    def nbytes(self) -> int:
+        return self.indices.nbytes + self.counts.nbytes
+
+    @property
+    def pixels(self) -> int:
+        """Number of cells of one energy"""
+        return self.shape[1] * self.shape[2]
+
+    def to_dense(self) -> np.ndarray:
+        image = np.zeros(self.shape, dtype=self.counts.dtype)
+        image.ravel()[self.indices] = self.counts
+        return image
+
+    def energy_slab(self, start: int, stop: int) -> np.ndarray:
+        """float64 dense [energy, col, row] cells of the energies start..stop-1"""
+        stop = min(stop, self.shape[0])
+        slab = np.zeros((max(stop - start, 0),) + self.shape[1:])
+        low, high = np.searchsorted(self.indices, [start * self.pixels, stop * self.pixels])
+        slab.ravel()[self.indices[low:high] - start * self.pixels] = self.counts[low:high]
+        return slab
+
+
+class SparseFrames:
+    """
+    The SparseFrame of every file of a dataset, stored as one array of indices
+    and counts with the frame of file i in [offsets[i], offsets[i+1]).
+    Indexing returns a SparseFrame view.
+    """
+
+    __slots__ = ("shape", "indices", "counts", "offsets")
+
+    def __init__(self, shape: tuple, indices: np.ndarray, counts: np.ndarray, offsets: np.ndarray):
+        """
+        Parameters
+        ----------
+        shape : tuple
+            (files, energy, col, row) shape of the dense images.
+        """
+        self.shape = tuple(shape)
+        self.indices = indices
+        self.counts = counts
+        self.offsets = offsets
+
+    @classmethod
+    def from_frames(cls, frames: list, shape: tuple) -> "SparseFrames":
+        """
+        Parameters
+        ----------
+        frames : list of SparseFrame
+            Frames of the same image shape.
+        shape : tuple
+            (energy, col, row) shape of the images, used when frames is empty.
+        """
+        offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(frame.indices) for frame in frames])
+        if not frames:
+            return cls((0,) + tuple(shape), np.zeros(0, np.uint32), np.zeros(0, np.uint16), offsets)
+        return cls((len(frames),) + tuple(shape),
+                   np.concatenate([frame.indices for frame in frames]),
+                   np.concatenate([frame.counts for frame in frames]),
+                   offsets)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, index: int) -> SparseFrame:
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        index %= len(self)
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return SparseFrame(self.shape[1:], self.indices[start:stop], self.counts[start:stop])
+
+    @property
+    def nbytes(self) -> int:
+        return self.indices.nbytes + self.counts.nbytes + self.offsets.nbytes
+
+    @property
+    def density(self) -> float:
+        """Fraction of the cells that are nonzero"""
+        return len(self.indices) / max(int(np.prod(self.shape, dtype=np.int64)), 1)
@@ -0,0 +1,143 @@
+"""
+On-disk cache of reduced spectra.
+
+Entries are keyed by the identity of the source file (path, size and
+modification time) combined with every parameter that affects the reduction,
+so a hit can skip both reading and binning the file. The cache is a single
+sqlite file with a size cap; the least recently used entries are evicted first.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+import numpy as np
+from models.counts import compact
+
+
+class SpectraCache:
+    """
+    Persistent least-recently-used cache of the spectra of .hxt files.
+
+    Usage
+    -----
+    with SpectraCache() as cache:
+        extract_spectra(data_frame, cache=cache, ...)
+    """
+
+    DEFAULT_MAX_BYTES = 1 << 30
+    # Puts are committed in batches, and on close()
+    COMMIT_INTERVAL = 64
+
+    def __init__(self, path: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Parameters
+        ----------
+        path : str, optional
+            Location of the sqlite cache file, see default_path(). Falls back to
+            an in-memory cache if it cannot be created.
+        max_bytes : int
+            Maximum total size of the cached spectra.
+        """
+        self.path = self.default_path() if path is None else path
+        self.max_bytes = max_bytes
+        self._pending = 0
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path)
+            self.__create_table()
+        except (OSError, sqlite3.OperationalError):
+            self._connection = sqlite3.connect(":memory:")
+            self.__create_table()
+
+    @staticmethod
+    def default_path() -> str:
+        cache_home = os.environ.get(
+            "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+        return os.path.join(cache_home, "sSAXS", "spectra_cache.sqlite")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.commit()
+        self._connection.close()
+
+    def __create_table(self):
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS spectra ("
+            "key TEXT PRIMARY KEY, dtype TEXT, shape TEXT, data BLOB, "
+            "nbytes INTEGER, last_access REAL)")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS spectra_last_access ON spectra (last_access)")
+        self._connection.commit()
+
+    @staticmethod
+    def parameters_key(*parameters) -> str:
+        """Digest of the reduction parameters, combined with each file by key()"""
+        return hashlib.sha1(repr(parameters).encode()).hexdigest()
+
+    @staticmethod
+    def key(file_path: str, parameters_key: str) -> str:
+        """The cache key of a file for the given parameters_key()"""
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        identity = f"{parameters_key}|{file_path}|{stat.st_size}|{stat.st_mtime_ns}"
+        return hashlib.sha1(identity.encode()).hexdigest()
+
+    def contains(self, keys: list) -> set:
+        """The given keys that are cached, their spectra are not read"""
+        keys = list(keys)
+        found = set()
+        # Queried in chunks below sqlite's limit of bound parameters
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            found.update(key for key, in self._connection.execute(
+                f"SELECT key FROM spectra WHERE key IN ({', '.join('?' * len(chunk))})",
+                chunk))
+        return found
+
+    def get(self, key: str):
+        """Returns the cached spectra as float64, or None on a miss"""
+        row = self._connection.execute(
+            "SELECT dtype, shape, data FROM spectra WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._connection.execute(
+            "UPDATE spectra SET last_access = ? WHERE key = ?", (time.time(), key))
+        dtype, shape, data = row
+        shape = tuple(int(n) for n in shape.split(",") if n)
+        return np.frombuffer(data, dtype=dtype).reshape(shape).astype(np.float64)
+
+    def put(self, key: str, spectra: np.ndarray):
+        # Spectra of photon counts are integral, so most are stored as uint16/32
+        spectra = np.ascontiguousarray(compact(spectra))
+        self._connection.execute(
+            "INSERT OR REPLACE INTO spectra VALUES (?, ?, ?, ?, ?, ?)",
+            (key, spectra.dtype.str, ",".join(str(n) for n in spectra.shape),
+             spectra.tobytes(), spectra.nbytes, time.time()))
+        self._pending += 1
+        if self._pending >= self.COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        """Evicts least recently used entries above max_bytes and commits"""
+        total, = self._connection.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM spectra").fetchone()
+        if total > self.max_bytes:
+            evicted = 0
+            stale = []
+            for key, nbytes in self._connection.execute(
+                    "SELECT key, nbytes FROM spectra ORDER BY last_access"):
+                if total - evicted <= self.max_bytes:
+                    break
+                stale.append((key,))
+                evicted += nbytes
+            self._connection.executemany("DELETE FROM spectra WHERE key = ?", stale)
+        self._connection.commit()
+        self._pending = 0
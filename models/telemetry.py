@@ -0,0 +1,135 @@
+"""
+Timed spans around the stages of an analysis, collected into a run report.
+
+A disabled Telemetry hands out one shared no-op context manager, so the
+instrumented code costs a method call per span when profiling is off. Spans
+nest: a span opened inside another one is reported as "outer/inner", and spans
+of the same name, e.g. one per file, are aggregated. Metrics that are not
+timings, e.g. the statistics of a reader, are recorded alongside the spans.
+"""
+
+from contextlib import contextmanager, nullcontext
+import time
+import tracemalloc
+
+_NULL_SPAN = nullcontext()
+
+
+class Telemetry:
+    """
+    Collector of the spans of one analysis run. Spans are expected to be
+    opened from one thread at a time, e.g. the analysis then the plotting.
+
+    Attributes
+    ----------
+    enabled : bool
+        Whether spans are recorded.
+    trace_memory : bool
+        Whether the peak memory allocated within each span is sampled with
+        tracemalloc, which slows Python allocations down.
+    """
+
+    def __init__(self, enabled: bool = False, trace_memory: bool = False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self._spans = {}
+        self._metrics = {}
+        # [name, peak traced bytes] of the open spans, innermost last
+        self._stack = []
+        self._started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def span(self, name: str):
+        """
+        Context manager timing the code it wraps as the span name, nested in
+        the spans already open.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return self.__span(name)
+
+    @contextmanager
+    def __span(self, name: str):
+        path = "/".join([frame[0] for frame in self._stack] + [name])
+        span = self._spans.setdefault(
+            path, {"name": path, "count": 0, "seconds": 0.0, "max_seconds": 0.0})
+        frame = [name, 0]
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            start_memory = current
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+            span["count"] += 1
+            span["seconds"] += seconds
+            span["max_seconds"] = max(span["max_seconds"], seconds)
+            if self.trace_memory:
+                peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+                span["peak_memory_mb"] = max(
+                    span.get("peak_memory_mb", 0.0), (peak - start_memory) / 2**20)
+
+    def record(self, name: str, metrics: dict):
+        """Records metrics of the run under name, replacing earlier ones"""
+        if self.enabled:
+            self._metrics[name] = dict(metrics)
+
+    def stop(self):
+        """Stops tracemalloc if this collector started it"""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def report(self) -> dict:
+        """
+        The run report.
+
+        Returns
+        -------
+        dict
+            "enabled", "trace_memory", "spans", the list of every span path
+            in the order first opened with its count, total and maximum
+            seconds and, when tracing memory, the peak MB allocated within it,
+            and "metrics", the metrics of every record() name.
+        """
+        return {
+            "enabled": self.enabled,
+            "trace_memory": self.trace_memory,
+            "spans": [dict(span) for span in self._spans.values()],
+            "metrics": {name: dict(metrics) for name, metrics in self._metrics.items()},
+        }
+
+
+def format_report(report: dict) -> str:
+    """The spans of a Telemetry.report() as a text table, then its metrics"""
+    metrics = [f"{name}: " + ", ".join(
+        f"{key} {value:.4g}" if isinstance(value, float) else f"{key} {value}"
+        for key, value in values.items())
+        for name, values in report.get("metrics", {}).items()]
+    if not report["spans"]:
+        return "\n".join(["No spans recorded"] + metrics)
+    width = max(len(span["name"]) for span in report["spans"])
+    memory = report["trace_memory"]
+    lines = [f"{'Span':{width}}  {'Count':>6}  {'Total ms':>10}  {'Max ms':>10}"
+             + ("  Peak MB" if memory else "")]
+    for span in report["spans"]:
+        line = (f"{span['name']:{width}}  {span['count']:>6}  "
+                f"{span['seconds']*1e3:>10.1f}  {span['max_seconds']*1e3:>10.1f}")
+        if memory:
+            line += f"  {span.get('peak_memory_mb', 0.0):>7.1f}"
+        lines.append(line)
+    return "\n".join(lines + metrics)
+
+
+# Shared disabled collector, the default of the instrumented functions
+NO_TELEMETRY = Telemetry()
@@ -1,4 +1,11 @@
 from .constants import Constants
 from .widget import WidgetUtils
 from .theme import Icon, IconName
-from .plot import PlotUtils
+
+
+def __getattr__(name: str):
+    # PlotUtils loads matplotlib and the 3D toolkit, so it is imported on first use
+    if name == "PlotUtils":
+        from .plot import PlotUtils
+        return PlotUtils
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
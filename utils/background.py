@@ -0,0 +1,124 @@
+import importlib
+import queue
+import threading
+import traceback
+import tkinter as tk
+from typing import Callable, Iterable
+
+
+class BackgroundTask:
+    """
+    Runs a long analysis on a worker thread while the Tk main loop keeps running.
+
+    The work function receives a progress callback to call with
+    (completed, total). Progress, the result and any error are queued by the
+    worker and handed to the callbacks on the Tk thread through after(), so the
+    callbacks may freely touch widgets and Matplotlib.
+    """
+
+    POLL_INTERVAL_ms = 50
+
+    class Cancelled(Exception):
+        """Raised inside the worker by the progress callback once cancel() was called"""
+
+    def __init__(
+        self,
+        widget: tk.Misc,
+        work: Callable[[Callable[[int, int], None]], object],
+        on_progress: Callable[[int, int], None],
+        on_done: Callable[[object], None],
+        on_cancelled: Callable[[], None],
+        on_error: Callable[[BaseException], None],
+    ):
+        self._widget = widget
+        self._work = work
+        self._on_progress = on_progress
+        self._on_done = on_done
+        self._on_cancelled = on_cancelled
+        self._on_error = on_error
+        self._events = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread.is_alive()
+
+    def start(self):
+        self._thread.start()
+        self._widget.after(self.POLL_INTERVAL_ms, self.__poll)
+
+    def cancel(self):
+        """Requests the worker to stop at its next progress report"""
+        self._cancel_event.set()
+
+    def progress(self, completed: int, total: int):
+        """Progress callback handed to the work function, called on the worker thread"""
+        if self._cancel_event.is_set():
+            raise BackgroundTask.Cancelled()
+        self._events.put(("progress", (completed, total)))
+
+    def __run(self):
+        try:
+            result = self._work(self.progress)
+        except BackgroundTask.Cancelled:
+            self._events.put(("cancelled", None))
+        except Exception as error:
+            traceback.print_exc()
+            self._events.put(("error", error))
+        else:
+            self._events.put(("done", result))
+
+    def __poll(self):
+        # Only the latest progress is shown, finishing events end the polling
+        latest_progress = None
+        while True:
+            try:
+                kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                latest_progress = payload
+                continue
+            if latest_progress:
+                self._on_progress(*latest_progress)
+            if kind == "done":
+                self._on_done(payload)
+            elif kind == "cancelled":
+                self._on_cancelled()
+            else:
+                self._on_error(payload)
+            return
+        if latest_progress:
+            self._on_progress(*latest_progress)
+        self._widget.after(self.POLL_INTERVAL_ms, self.__poll)
+
+
+def warm_up(modules: Iterable[str]) -> threading.Thread:
+    """
+    Imports the modules on a daemon thread, so the first analysis does not wait
+    for them. Importing them again later is instant, or waits for this thread
+    to finish importing them.
+
+    Parameters
+    ----------
+    modules : Iterable[str]
+        Absolute names of the modules to import, in order.
+
+    Returns
+    -------
+    threading.Thread
+        The started thread.
+    """
+
+    def run():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except Exception:
+                # Left for the analysis that needs the module to report
+                traceback.print_exc()
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -1,6 +1,10 @@
-from typing import Callable
+from typing import TYPE_CHECKING, Callable, Dict
+import tkinter as tk
 from tkinter import ttk
 
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
 
 class WidgetUtils:
 
@@ -33,3 +37,83 @@ class WidgetUtils:
             widget.state([disabled_state])
 
         return callback
+
+    def show_progress(
+        progress_bar: ttk.Progressbar, status_label: ttk.Label
+    ) -> Callable[[int, int], None]:
+        def show(completed: int, total: int):
+            progress_bar.config(maximum=max(total, 1), value=completed)
+            status_label.config(text=f"Files completed: {completed}/{total}")
+
+        return show
+
+    def show_running(
+        submit_button: ttk.Button,
+        cancel_button: ttk.Button,
+        progress_bar: ttk.Progressbar,
+        status_label: ttk.Label,
+    ) -> Callable[[bool, str], None]:
+        def show(is_running: bool, message: str):
+            submit_button.state(["disabled" if is_running else "!disabled"])
+            cancel_button.state(["!disabled" if is_running else "disabled"])
+            if is_running:
+                progress_bar.config(value=0)
+            status_label.config(text=message)
+
+        return show
+
+    def show_figures(
+        figures_notebook: ttk.Notebook,
+    ) -> Callable[[Dict[str, "Figure"]], None]:
+        """
+        Embeds every figure in its own tab of the notebook. The tab of a key is
+        created once and redrawn when its figure is drawn again.
+        """
+        canvases = {}
+
+        def show(figures: Dict[str, "Figure"]):
+            # Imported with the first figures, matplotlib is not loaded at startup
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+            for key, figure in figures.items():
+                canvas = canvases.get(key)
+                if canvas is not None and canvas.figure is not figure:
+                    # A different figure, the previous one is released with its tab
+                    canvas.get_tk_widget().master.destroy()
+                    canvas = None
+                if canvas is None:
+                    tab = ttk.Frame(figures_notebook)
+                    canvas = FigureCanvasTkAgg(figure, master=tab)
+                    toolbar = NavigationToolbar2Tk(canvas, tab, pack_toolbar=False)
+                    toolbar.pack(side="bottom", fill="x")
+                    canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
+                    figures_notebook.add(
+                        tab, text=key.replace("_", " ").capitalize())
+                    canvases[key] = canvas
+                canvas.draw_idle()
+            if canvases:
+                figures_notebook.grid()
+
+        return show
+
+    def show_report(figures_notebook: ttk.Notebook) -> Callable[[str], None]:
+        """
+        Shows a text report, e.g. a profile of the analysis, in a tab of the
+        notebook created on the first call and updated by the next ones.
+        """
+        report_text: Dict[str, tk.Text] = {}
+
+        def show(report: str):
+            text = report_text.get("text")
+            if text is None:
+                tab = ttk.Frame(figures_notebook)
+                text = tk.Text(tab, wrap="none", font="TkFixedFont")
+                text.pack(side="top", fill="both", expand=True)
+                figures_notebook.add(tab, text="Profile")
+                report_text["text"] = text
+            text.config(state="normal")
+            text.delete("1.0", "end")
+            text.insert("1.0", report)
+            text.config(state="disabled")
+            figures_notebook.grid()
+
+        return show
@@ -7,12 +7,19 @@ import tkinter as tk
 from utils import Constants
 from utils.theme import get_system_theme, Icon, IconName
 from frames import RootFrame
+from utils.background import warm_up
 import sv_ttk
 
 
 class MainWindow:
 
     MIN_WIDTH, MIN_HEIGHT = 1200, 800
+    # The analysis and plotting stack, not needed to show the window
+    WARM_UP_MODULES = (
+        "models.energy_windowing_model",
+        "models.scan_reconstruction_model",
+        "matplotlib.backends.backend_tkagg",
+    )
 
     def __init__(self):
         self.root = tk.Tk()
@@ -25,6 +32,8 @@ class MainWindow:
         # sets the Sun Valley theme. theme options are 'dark' and 'light'
         sv_ttk.set_theme(theme=get_system_theme())
         self.init_frame()
+        # Loaded in the background once the window is drawn
+        self.root.after_idle(warm_up, MainWindow.WARM_UP_MODULES)
 
     def init_frame(self) -> None:
         root_frame = RootFrame(self.root)